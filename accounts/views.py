@@ -4,12 +4,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
 from django.contrib.auth.models import User
+from django.conf import settings
 
 from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm
 from .models import UserProfile
 from orders.models import Address, Order
 from orders.forms import AddressForm
 from shop.models import Wishlist
+from shop.pagination import KeysetPaginator
 
 
 def register(request):
@@ -201,8 +203,10 @@ def wishlist(request):
 
 @login_required
 def order_history(request):
-    """Order history"""
-    orders = Order.objects.filter(user=request.user)
+    """Order history, newest first, a page at a time"""
+    orders = KeysetPaginator(
+        Order.objects.filter(user=request.user), settings.ORDER_HISTORY_PAGE_SIZE, count_cap=0
+    ).get_page(request)
     
     return render(request, 'accounts/order_history.html', {'orders': orders})
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Coupon
+from .models import Coupon, StoredCart, StoredCartLine
 
 
 @admin.register(Coupon)
@@ -8,3 +8,17 @@ class CouponAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'valid_from', 'valid_to']
     search_fields = ['code']
     list_editable = ['is_active']
+
+
+class StoredCartLineInline(admin.TabularInline):
+    model = StoredCartLine
+    raw_id_fields = ['product']
+    extra = 0
+
+
+@admin.register(StoredCart)
+class StoredCartAdmin(admin.ModelAdmin):
+    list_display = ['user', 'created_at', 'updated_at']
+    search_fields = ['user__username', 'user__email']
+    raw_id_fields = ['user']
+    inlines = [StoredCartLineInline]
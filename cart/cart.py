@@ -1,17 +1,104 @@
 from decimal import Decimal
 from django.conf import settings
+from django.db import transaction
+from shop.cache import get_catalog_version, get_stock_version
 from shop.models import Product
+from .storage import OVERFLOW_MARKER, get_storage
+
+
+def get_cart(request):
+    """The request's Cart, created on first use and shared by views and templates"""
+    cart = getattr(request, '_cart', None)
+    if cart is None:
+        cart = request._cart = Cart(request)
+    return cart
+
+
+def get_cart_summary(request):
+    """The request's Cart if a view already resolved it, else a CartSummary read without creating one"""
+    cart = getattr(request, '_cart', None)
+    if cart is None:
+        cart = CartSummary(get_storage(request).load())
+    return cart
+
+
+class CartSummary:
+    """Read-only item count and subtotal for the header badge"""
+    __slots__ = ('count', 'total')
+
+    def __init__(self, items):
+        self.count = sum(item['quantity'] for item in items.values())
+        self.total = sum((Decimal(item['price']) * item['quantity'] for item in items.values()), Decimal('0'))
+
+    def __len__(self):
+        return self.count
+
+    def get_total_price(self):
+        return self.total
+
+
+class CartLine:
+    """A cart entry resolved against its product"""
+    __slots__ = ('product_id', 'product', 'quantity', 'price', 'total_price')
+
+    def __init__(self, product_id, product, quantity, price):
+        self.product_id = product_id
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+        self.total_price = price * quantity
+
+    @property
+    def update_form(self):
+        from .forms import CartAddProductForm
+        return CartAddProductForm(initial={'quantity': self.quantity, 'update': True})
+
+
+class CartChange:
+    """A difference between a cart line and the current state of its product"""
+    __slots__ = ('kind', 'product_id', 'name', 'old_price', 'new_price', 'quantity', 'stock')
+
+    PRICE_CHANGED = 'price_changed'
+    UNAVAILABLE = 'unavailable'
+    OUT_OF_STOCK = 'out_of_stock'
+    REMOVED = 'removed'
+
+    def __init__(self, kind, product_id, name='', old_price=None, new_price=None, quantity=0, stock=None):
+        self.kind = kind
+        self.product_id = product_id
+        self.name = name
+        self.old_price = old_price
+        self.new_price = new_price
+        self.quantity = quantity
+        self.stock = stock
+
+    @property
+    def blocks_checkout(self):
+        return self.kind in (self.UNAVAILABLE, self.OUT_OF_STOCK)
+
+    @property
+    def message(self):
+        if self.kind == self.PRICE_CHANGED:
+            return f'The price of {self.name} has changed from ₹{self.old_price} to ₹{self.new_price}.'
+        if self.kind == self.UNAVAILABLE:
+            return f'{self.name} is no longer available.'
+        if self.kind == self.OUT_OF_STOCK:
+            if self.stock:
+                return f'Only {self.stock} of {self.name} left in stock.'
+            return f'{self.name} is out of stock.'
+        return 'An item that is no longer sold was removed from your cart.'
 
 
 class Cart:
-    """Shopping cart implementation using sessions"""
+    """Shopping cart kept in the session, a signed cookie or StoredCartLine rows (see cart.storage)"""
     
     def __init__(self, request):
         self.session = request.session
-        cart = self.session.get('cart')
-        if not cart:
-            cart = self.session['cart'] = {}
-        self.cart = cart
+        self.storage = get_storage(request)
+        self.cart = self.storage.load()
+        self._lines = None
+        self._subtotal = None
+        self._count = None
 
     def add(self, product, quantity=1, update_quantity=False):
         """Add product to cart or update quantity"""
@@ -28,6 +115,7 @@ class Cart:
         else:
             self.cart[product_id]['quantity'] += quantity
         
+        self.storage.save_line(product_id, self.cart[product_id])
         self.save()
 
     def remove(self, product):
@@ -35,41 +123,121 @@ class Cart:
         product_id = str(product.id)
         if product_id in self.cart:
             del self.cart[product_id]
+            self.storage.delete_line(product_id)
+            self.save()
+
+    def apply(self, quantities):
+        """Set several {product: quantity} at once (0 removes the line), persisting the cart once"""
+        saved, removed = {}, []
+        for product, quantity in quantities.items():
+            product_id = str(product.id)
+            if quantity > 0:
+                item = self.cart.setdefault(product_id, {'quantity': 0, 'price': str(product.final_price)})
+                item['quantity'] = quantity
+                saved[product_id] = item
+            elif self.cart.pop(product_id, None) is not None:
+                removed.append(product_id)
+        with transaction.atomic():
+            if saved:
+                self.storage.save_lines(saved)
+            if removed:
+                self.storage.delete_lines(removed)
+        self.save()
+
+    def reprice(self):
+        """Revalidate lines against current prices, availability and stock; returns CartChanges"""
+        if not self.cart:
+            return []
+        # Read before the products so a write racing with the query forces another check;
+        # both counters only grow, so the sum changes whenever either does
+        version = get_catalog_version() + get_stock_version()
+        if self.storage.get_checked(self.cart) == version:
+            return []
+
+        products = Product.objects.in_bulk([int(product_id) for product_id in self.cart])
+        changes, saved, removed = [], {}, []
+        for product_id, item in list(self.cart.items()):
+            product = products.get(int(product_id))
+            if product is None:
+                del self.cart[product_id]
+                removed.append(product_id)
+                changes.append(CartChange(CartChange.REMOVED, int(product_id)))
+                continue
+            price = Decimal(item['price'])
+            if price != product.final_price:
+                changes.append(CartChange(
+                    CartChange.PRICE_CHANGED, product.id, product.name,
+                    old_price=price, new_price=product.final_price, quantity=item['quantity']
+                ))
+                item['price'] = str(product.final_price)
+                saved[product_id] = item
+            if not product.is_available:
+                changes.append(CartChange(
+                    CartChange.UNAVAILABLE, product.id, product.name, quantity=item['quantity']
+                ))
+            elif product.stock < item['quantity']:
+                changes.append(CartChange(
+                    CartChange.OUT_OF_STOCK, product.id, product.name,
+                    quantity=item['quantity'], stock=product.stock
+                ))
+
+        if saved or removed:
+            with transaction.atomic():
+                if saved:
+                    self.storage.save_lines(saved)
+                if removed:
+                    self.storage.delete_lines(removed)
             self.save()
+        # The products just loaded are current, so the lines need no query of their own
+        self._lines = [
+            CartLine(int(product_id), products[int(product_id)], item['quantity'], Decimal(item['price']))
+            for product_id, item in self.cart.items()
+        ]
+        if not any(change.blocks_checkout for change in changes):
+            self.storage.set_checked(version, self.cart)
+        return changes
 
     def save(self):
-        """Save cart to session"""
-        self.session.modified = True
+        """Persist the cart and forget derived values"""
+        self.storage.save()
+        self._lines = None
+        self._subtotal = None
+        self._count = None
+
+    @property
+    def lines(self):
+        """CartLines for every entry, resolved with one product query and reused afterwards"""
+        if self._lines is None:
+            products = Product.objects.in_bulk([int(product_id) for product_id in self.cart])
+            self._lines = [
+                CartLine(int(product_id), products.get(int(product_id)), item['quantity'], Decimal(item['price']))
+                for product_id, item in self.cart.items()
+            ]
+        return self._lines
 
     def __iter__(self):
-        """Iterate over cart items"""
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        cart = self.cart.copy()
-        
-        for product in products:
-            cart[str(product.id)]['product'] = product
-        
-        for item in cart.values():
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        """Iterate over cart lines"""
+        return iter(self.lines)
 
     def __len__(self):
         """Count total items in cart"""
-        return sum(item['quantity'] for item in self.cart.values())
+        if self._count is None:
+            self._count = sum(item['quantity'] for item in self.cart.values())
+        return self._count
 
     def get_total_price(self):
         """Calculate total cart price"""
-        return sum(
-            Decimal(item['price']) * item['quantity']
-            for item in self.cart.values()
-        )
+        if self._subtotal is None:
+            self._subtotal = sum(
+                (Decimal(item['price']) * item['quantity'] for item in self.cart.values()),
+                Decimal('0')
+            )
+        return self._subtotal
 
     def get_discount(self, coupon=None):
         """Calculate discount if coupon applied"""
         if coupon:
-            return (self.get_total_price() * coupon.discount) / 100
+            return coupon.get_discount(self.get_total_price())
         return Decimal('0')
 
     def get_final_total(self, coupon=None):
@@ -78,9 +246,18 @@ class Cart:
 
     def clear(self):
         """Clear the cart"""
-        del self.session['cart']
+        self.cart = self.storage.clear()
         self.save()
 
     def get_item_count(self):
         """Get unique item count"""
         return len(self.cart)
+
+
+def cart_fingerprint(request):
+    """Short string that changes whenever the cart contents do, without creating a cart"""
+    cookie = request.COOKIES.get(settings.CART_COOKIE_NAME)
+    if cookie and cookie != OVERFLOW_MARKER:
+        return cookie
+    cart = request.session.get('cart') or {}
+    return ','.join(f"{product_id}x{item['quantity']}" for product_id, item in sorted(cart.items()))
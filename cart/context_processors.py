@@ -1,6 +1,8 @@
-from .cart import Cart
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart_summary
 
 
 def cart(request):
-    """Cart context processor"""
-    return {'cart': Cart(request)}
+    """Cart context processor; resolved only if the template shows the cart"""
+    return {'cart': SimpleLazyObject(lambda: get_cart_summary(request))}
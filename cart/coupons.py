@@ -0,0 +1,102 @@
+"""
+Coupon lookups and redemption.
+
+Codes are matched on Coupon.normalized_code, so lookups are exact matches on
+a unique index instead of code__iexact. Each worker keeps the active,
+unexpired coupons in memory by normalized code and id; the coupon version
+bumped by cart.signals is checked at most every COUPON_CACHE_MAX_AGE seconds
+and a change reloads them. A coupon is dropped once its valid_to passes.
+
+used_count in the cache is only as fresh as the last reload, so it is good
+for showing a coupon but not for accepting an order: redeem() enforces
+usage_limit with a conditional UPDATE inside the order's transaction.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from shop.cache import bump_version, get_version
+from .models import Coupon, normalize_coupon_code
+
+
+COUPON_VERSION_KEY = 'cart:coupon-version'
+
+
+class CouponUnavailable(Exception):
+    """The coupon is used up, expired or deactivated"""
+
+
+def get_coupon_version():
+    return get_version(COUPON_VERSION_KEY)
+
+
+def bump_coupon_version():
+    return bump_version(COUPON_VERSION_KEY)
+
+
+class CouponCache:
+    """Per-worker map of normalized code and id to active Coupons"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_code = {}
+        self.by_id = {}
+        self.version = None
+        self.checked_at = 0
+
+    def get(self, code):
+        self.refresh()
+        return self._unexpired(self.by_code.get(normalize_coupon_code(code)))
+
+    def get_by_id(self, coupon_id):
+        self.refresh()
+        return self._unexpired(self.by_id.get(coupon_id))
+
+    def _unexpired(self, coupon):
+        if coupon is None:
+            return None
+        if coupon.valid_to < timezone.now():
+            self.by_code.pop(coupon.normalized_code, None)
+            self.by_id.pop(coupon.id, None)
+            return None
+        return coupon
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        max_age = getattr(settings, 'COUPON_CACHE_MAX_AGE', 30)
+        if not force and self.version is not None and now - self.checked_at < max_age:
+            return
+        with self.lock:
+            self.checked_at = now
+            # Read before loading so an edit racing with the query triggers another reload
+            version = get_coupon_version()
+            if version != self.version:
+                coupons = list(Coupon.objects.filter(is_active=True, valid_to__gte=timezone.now()))
+                self.by_code = {coupon.normalized_code: coupon for coupon in coupons}
+                self.by_id = {coupon.id: coupon for coupon in coupons}
+                self.version = version
+
+    def invalidate(self):
+        """Check the version on the next lookup; used after a coupon is saved in this worker"""
+        self.checked_at = 0
+
+
+coupon_cache = CouponCache()
+
+
+def redeem(coupon):
+    """Count one use of coupon, raising CouponUnavailable if none are left; call inside the order's transaction"""
+    now = timezone.now()
+    updated = Coupon.objects.filter(
+        pk=coupon.pk,
+        is_active=True,
+        valid_from__lte=now,
+        valid_to__gte=now,
+        used_count__lt=F('usage_limit'),
+    ).update(used_count=F('used_count') + 1)
+    if not updated:
+        raise CouponUnavailable(coupon.code)
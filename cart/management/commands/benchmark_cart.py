@@ -0,0 +1,90 @@
+import copy
+import json
+import time
+from decimal import Decimal
+
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from cart.cart import get_cart
+from shop.models import Product
+
+
+def legacy_page(session_cart):
+    """The pre-memoization cart page: every pass re-queries products and re-parses prices"""
+    def lines():
+        products = Product.objects.filter(id__in=session_cart.keys())
+        cart = copy.deepcopy(session_cart)
+        for product in products:
+            cart[str(product.id)]['product'] = product
+        for item in cart.values():
+            item['price'] = Decimal(item['price'])
+            item['total_price'] = item['price'] * item['quantity']
+            yield item
+
+    def subtotal():
+        return sum(Decimal(item['price']) * item['quantity'] for item in session_cart.values())
+
+    totals = [item['total_price'] for item in lines()]
+    totals = [item['total_price'] for item in lines()]
+    return totals, [subtotal() for _ in range(4)][-1]
+
+
+def resolved_page(request):
+    """The same page with the request's memoized cart"""
+    cart = get_cart(request)
+    totals = [line.total_price for line in cart]
+    totals = [line.total_price for line in cart]
+    return totals, [cart.get_total_price() for _ in range(4)][-1]
+
+
+class Command(BaseCommand):
+    help = 'Time resolving a large cart the way the cart page does'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=50)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.filter(is_available=True)[:options['lines']])
+        if len(products) < options['lines']:
+            raise CommandError(f'Need {options["lines"]} available products - run seed_benchmark_data first')
+        session_cart = {
+            str(product.id): {'quantity': index % 3 + 1, 'price': str(product.final_price)}
+            for index, product in enumerate(products)
+        }
+        snapshot = json.dumps(session_cart, sort_keys=True)
+        iterations = options['iterations']
+        self.stdout.write(f'Cart lines: {len(session_cart)}, iterations: {iterations}\n')
+
+        factory = RequestFactory()
+        results = {}
+        runs = [
+            ('legacy', lambda: legacy_page(session_cart)),
+            ('resolved', lambda: resolved_page(self.request(factory, session_cart))),
+        ]
+        for name, page in runs:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    results[name] = page()
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  {name:<10} {elapsed / iterations * 1000:8.3f} ms/page  '
+                f'{len(queries) / iterations:5.1f} queries/page'
+            )
+
+        if results['legacy'] != results['resolved']:
+            raise CommandError('Resolved cart totals differ from the legacy computation')
+        if json.dumps(session_cart, sort_keys=True) != snapshot:
+            raise CommandError('Resolving the cart modified the session payload')
+        self.stdout.write(self.style.SUCCESS('\n✅ Totals match and the session payload is untouched'))
+
+    def request(self, factory, session_cart):
+        request = factory.get('/cart/')
+        request.session = SessionBase()
+        request.session['cart'] = session_cart
+        return request
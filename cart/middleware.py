@@ -0,0 +1,24 @@
+from django.conf import settings
+
+
+class CartCookieMiddleware:
+    """Send the cart cookie written by CookieCartStorage during the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        value = getattr(request, '_cart_cookie', None)
+        if value:
+            response.set_cookie(
+                settings.CART_COOKIE_NAME,
+                value,
+                max_age=settings.CART_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        elif value is not None:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+def fill_normalized_codes(apps, schema_editor):
+    Coupon = apps.get_model('cart', 'Coupon')
+    codes = {}
+    for code in Coupon.objects.order_by('code').values_list('code', flat=True):
+        codes.setdefault(code.strip().upper(), []).append(code)
+    clashes = [' / '.join(f'"{code}"' for code in same) for same in codes.values() if len(same) > 1]
+    if clashes:
+        # Which coupon a customer typing the code should get is a business decision, not a migration's
+        raise RuntimeError(
+            'Coupon codes are about to become case-insensitive, but these differ only in case or '
+            'surrounding spaces: ' + ', '.join(clashes) + '. Rename or delete all but one of each and migrate again.'
+        )
+    for coupon in Coupon.objects.all():
+        coupon.normalized_code = coupon.code.strip().upper()
+        coupon.save(update_fields=['normalized_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_storedcart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coupon',
+            name='normalized_code',
+            field=models.CharField(editable=False, max_length=50, null=True),
+        ),
+        migrations.RunPython(fill_normalized_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='coupon',
+            name='normalized_code',
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+    ]
@@ -1,10 +1,18 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 
 
+def normalize_coupon_code(code):
+    """The key coupons are looked up by, so 'save10 ' finds SAVE10"""
+    return code.strip().upper()
+
+
 class Coupon(models.Model):
     """Discount coupons"""
     code = models.CharField(max_length=50, unique=True)
+    normalized_code = models.CharField(max_length=50, unique=True, editable=False)
     discount = models.PositiveIntegerField(help_text="Percentage discount")
     min_order_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     max_discount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -17,6 +25,24 @@ class Coupon(models.Model):
     def __str__(self):
         return f"{self.code} - {self.discount}%"
     
+    def clean(self):
+        duplicate = Coupon.objects.filter(normalized_code=normalize_coupon_code(self.code)).exclude(pk=self.pk)
+        if duplicate.exists():
+            raise ValidationError({'code': 'A coupon with this code already exists.'})
+    
+    def save(self, *args, **kwargs):
+        self.normalized_code = normalize_coupon_code(self.code)
+        super().save(*args, **kwargs)
+    
+    def get_discount(self, subtotal):
+        """Percentage of subtotal capped at max_discount; nothing below min_order_value"""
+        if subtotal < self.min_order_value:
+            return Decimal('0')
+        discount = (subtotal * self.discount / 100).quantize(Decimal('0.01'))
+        if self.max_discount is not None:
+            discount = min(discount, self.max_discount)
+        return discount
+    
     def is_valid(self):
         from django.utils import timezone
         now = timezone.now()
@@ -25,3 +51,28 @@ class Coupon(models.Model):
             self.valid_from <= now <= self.valid_to and
             self.used_count < self.usage_limit
         )
+
+
+class StoredCart(models.Model):
+    """Database cart for a signed-in user, used when CART_STORAGE is 'database'"""
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name='stored_cart')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.user}"
+
+
+class StoredCartLine(models.Model):
+    """One product in a StoredCart"""
+    cart = models.ForeignKey(StoredCart, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey('shop.Product', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['cart', 'product']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id}"
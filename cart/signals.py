@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .coupons import bump_coupon_version, coupon_cache
+from .models import Coupon
+from .storage import merge_session_cart
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Carry what was added before signing in over to the stored cart"""
+    if getattr(settings, 'CART_STORAGE', 'session') == 'database' and request is not None:
+        merge_session_cart(request.session, user.pk)
+        # A Cart resolved earlier in this request still points at the session
+        request.__dict__.pop('_cart', None)
+
+
+@receiver(user_logged_out)
+def clear_cart_cookie_on_logout(sender, request, **kwargs):
+    """Logging out empties a session cart; do the same for the cookie one"""
+    if getattr(settings, 'CART_STORAGE', 'session') == 'cookie' and request is not None:
+        request._cart_cookie = ''
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, **kwargs):
+    bump_coupon_version()
+    coupon_cache.invalidate()
@@ -0,0 +1,329 @@
+"""
+Where a Cart keeps its lines.
+
+Every storage hands Cart the same mapping of str(product_id) to
+{'quantity': int, 'price': str}. SessionCartStorage keeps that mapping in the
+session and rewrites it with the session; DatabaseCartStorage keeps one
+StoredCartLine row per product for signed-in users (CART_STORAGE =
+'database'), so a change writes only the row that changed and the cart
+follows the user across devices.
+
+CookieCartStorage (CART_STORAGE = 'cookie') keeps no server state at all:
+product ids and quantities are packed as varints into a signed cookie that
+CartCookieMiddleware sends, and prices come from the catalog snapshot when
+the cookie is read. The cookie also carries the catalog version the cart was
+last repriced against. A cart too big for CART_COOKIE_MAX_SIZE moves into the
+session until it shrinks again.
+"""
+
+import base64
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core import signing
+
+from shop.cache import bump_user_version
+from shop.catalog import catalog
+from shop.models import Product
+from .models import StoredCart, StoredCartLine
+
+
+SESSION_KEY = 'cart'
+
+# Catalog version and lines digest of the last repricing that found nothing blocking checkout
+CHECKED_SESSION_KEY = 'cart_checked'
+
+# CartAddProductForm's per-line limit
+MAX_MERGED_QUANTITY = 20
+
+COOKIE_FORMAT = 1
+COOKIE_SALT = 'cart.cookie'
+# Cookie value of a cart that outgrew the cookie and lives in the session
+OVERFLOW_MARKER = 'session'
+
+
+def get_storage(request):
+    mode = getattr(settings, 'CART_STORAGE', 'session')
+    if mode == 'cookie':
+        return CookieCartStorage(request)
+    if mode == 'database' and request.user.is_authenticated:
+        return DatabaseCartStorage(request.user.pk, request.session)
+    return SessionCartStorage(request.session)
+
+
+def lines_digest(cart):
+    lines = ','.join(
+        f"{product_id}x{item['quantity']}@{item['price']}" for product_id, item in sorted(cart.items())
+    )
+    return hashlib.md5(lines.encode()).hexdigest()
+
+
+def get_session_checked(session, cart):
+    """Catalog version these exact lines were last repriced against, or None"""
+    stamp = session.get(CHECKED_SESSION_KEY)
+    if stamp:
+        version, digest = stamp.split(':')
+        if digest == lines_digest(cart):
+            return int(version)
+    return None
+
+
+def set_session_checked(session, version, cart):
+    session[CHECKED_SESSION_KEY] = f'{version}:{lines_digest(cart)}'
+
+
+class SessionCartStorage:
+    """The session dict is the cart itself; changes are persisted with the session"""
+
+    def __init__(self, session):
+        self.session = session
+        self.cart = None
+
+    def load(self):
+        # Not stored until the first change, so browsing never creates a session
+        self.cart = self.session.get(SESSION_KEY) or {}
+        return self.cart
+
+    def save_line(self, product_id, item):
+        pass
+
+    def save_lines(self, items):
+        pass
+
+    def delete_line(self, product_id):
+        pass
+
+    def delete_lines(self, product_ids):
+        pass
+
+    def clear(self):
+        self.cart = {}
+        return self.cart
+
+    def save(self):
+        self.session[SESSION_KEY] = self.cart
+
+    def get_checked(self, cart):
+        return get_session_checked(self.session, cart)
+
+    def set_checked(self, version, cart):
+        set_session_checked(self.session, version, cart)
+
+
+class DatabaseCartStorage:
+    """One StoredCartLine row per product, upserted as lines change"""
+
+    def __init__(self, user_id, session=None):
+        self.user_id = user_id
+        self.session = session
+        self.has_cart = None
+
+    def load(self):
+        lines = StoredCartLine.objects.filter(cart_id=self.user_id).values_list('product_id', 'quantity', 'price')
+        cart = {
+            str(product_id): {'quantity': quantity, 'price': str(price)}
+            for product_id, quantity, price in lines
+        }
+        # Lines imply the cart row exists; otherwise create it before the first write
+        self.has_cart = bool(cart) or None
+        return cart
+
+    def save_line(self, product_id, item):
+        self.save_lines({product_id: item})
+
+    def save_lines(self, items):
+        """Insert or update the given lines in a single statement"""
+        self.ensure_cart()
+        StoredCartLine.objects.bulk_create(
+            [
+                StoredCartLine(
+                    cart_id=self.user_id,
+                    product_id=int(product_id),
+                    quantity=item['quantity'],
+                    price=item['price'],
+                )
+                for product_id, item in items.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'price', 'updated_at'],
+        )
+
+    def delete_line(self, product_id):
+        self.delete_lines([product_id])
+
+    def delete_lines(self, product_ids):
+        StoredCartLine.objects.filter(
+            cart_id=self.user_id, product_id__in=[int(product_id) for product_id in product_ids]
+        ).delete()
+
+    def clear(self):
+        StoredCartLine.objects.filter(cart_id=self.user_id).delete()
+        return {}
+
+    def save(self):
+        # Catalog page ETags cover the session cart; this is how they see a stored one change
+        bump_user_version(self.user_id)
+
+    def get_checked(self, cart):
+        return get_session_checked(self.session, cart)
+
+    def set_checked(self, version, cart):
+        set_session_checked(self.session, version, cart)
+
+    def ensure_cart(self):
+        if self.has_cart:
+            return
+        # Tolerates a concurrent request creating it first
+        StoredCart.objects.bulk_create([StoredCart(user_id=self.user_id)], ignore_conflicts=True)
+        self.has_cart = True
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def _read_varints(data):
+    values, value, shift = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append(value)
+            value, shift = 0, 0
+    if shift:
+        raise ValueError('Truncated varint')
+    return values
+
+
+def encode_cart(checked_version, quantities):
+    """Signed cookie value for [(product_id, quantity)]; zlib-compressed when that is shorter"""
+    data = bytes(_varint(COOKIE_FORMAT) + _varint(checked_version or 0))
+    data += b''.join(bytes(_varint(product_id) + _varint(quantity)) for product_id, quantity in quantities)
+    compressed = zlib.compress(data, 9)
+    if len(compressed) < len(data) - 1:
+        value = '.' + base64.urlsafe_b64encode(compressed).decode().rstrip('=')
+    else:
+        value = base64.urlsafe_b64encode(data).decode().rstrip('=')
+    return signing.Signer(salt=COOKIE_SALT).sign(value)
+
+
+def decode_cart(value):
+    """(checked_version, [(product_id, quantity)]) from encode_cart's output; an empty cart if tampered with"""
+    try:
+        value = signing.Signer(salt=COOKIE_SALT).unsign(value)
+        compressed = value.startswith('.')
+        data = base64.urlsafe_b64decode(value.lstrip('.') + '=' * (-len(value.lstrip('.')) % 4))
+        if compressed:
+            data = zlib.decompress(data)
+        values = _read_varints(data)
+    except (signing.BadSignature, ValueError, zlib.error):
+        return None, []
+    if len(values) < 2 or values[0] != COOKIE_FORMAT or len(values) % 2:
+        return None, []
+    return values[1] or None, list(zip(values[2::2], values[3::2]))
+
+
+class CookieCartStorage:
+    """Product ids and quantities in a signed cookie, priced from the catalog snapshot"""
+
+    def __init__(self, request):
+        self.request = request
+        self.cart = {}
+        self.checked = None
+        # A SessionCartStorage while the cart is too big for the cookie
+        self.overflow = None
+
+    def load(self):
+        value = self.request.COOKIES.get(settings.CART_COOKIE_NAME)
+        if value == OVERFLOW_MARKER:
+            self.overflow = SessionCartStorage(self.request.session)
+            self.cart = self.overflow.load()
+            return self.cart
+        self.checked, quantities = decode_cart(value) if value else (None, [])
+        self.cart = {}
+        for product_id, quantity in quantities:
+            record = catalog.get(product_id)
+            if record is not None:
+                self.cart[str(product_id)] = {'quantity': quantity, 'price': str(record.final_price)}
+        return self.cart
+
+    def save_line(self, product_id, item):
+        pass
+
+    def save_lines(self, items):
+        pass
+
+    def delete_line(self, product_id):
+        pass
+
+    def delete_lines(self, product_ids):
+        pass
+
+    def clear(self):
+        self.cart = {}
+        return self.cart
+
+    def save(self):
+        self.checked = None
+        self.write()
+
+    def get_checked(self, cart):
+        if self.overflow is not None:
+            return self.overflow.get_checked(cart)
+        return self.checked
+
+    def set_checked(self, version, cart):
+        if self.overflow is not None:
+            self.overflow.set_checked(version, cart)
+        else:
+            self.checked = version
+            self.write()
+
+    def write(self):
+        """Queue the cookie for CartCookieMiddleware, moving the cart to the session if it is too big"""
+        value = ''
+        if self.cart:
+            value = encode_cart(self.checked, [
+                (int(product_id), item['quantity']) for product_id, item in self.cart.items()
+            ])
+        if len(value) > getattr(settings, 'CART_COOKIE_MAX_SIZE', 1024):
+            if self.overflow is None:
+                self.overflow = SessionCartStorage(self.request.session)
+            self.overflow.cart = self.cart
+            self.overflow.save()
+            value = OVERFLOW_MARKER
+        elif self.overflow is not None:
+            self.request.session.pop(SESSION_KEY, None)
+            self.request.session.pop(CHECKED_SESSION_KEY, None)
+            self.overflow = None
+        self.request._cart_cookie = value
+
+
+def merge_session_cart(session, user_id):
+    """Move an anonymous session cart into the user's stored cart, adding quantities"""
+    session_cart = session.get(SESSION_KEY)
+    if not session_cart:
+        return
+    storage = DatabaseCartStorage(user_id, session)
+    stored = storage.load()
+    existing = set(Product.objects.filter(id__in=[int(pk) for pk in session_cart]).values_list('id', flat=True))
+    merged = {}
+    for product_id, item in session_cart.items():
+        if int(product_id) not in existing:
+            continue
+        merged[product_id] = {'quantity': item['quantity'], 'price': item['price']}
+        if product_id in stored:
+            merged[product_id]['quantity'] = min(
+                stored[product_id]['quantity'] + item['quantity'], MAX_MERGED_QUANTITY
+            )
+    if merged:
+        storage.save_lines(merged)
+        storage.save()
+    del session[SESSION_KEY]
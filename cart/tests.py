@@ -0,0 +1,60 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.db import OperationalError, connection, transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from .coupons import CouponUnavailable, redeem
+from .models import Coupon
+
+
+class CouponRedemptionTests(TransactionTestCase):
+    """usage_limit holds when many checkouts redeem one coupon at once (run on PostgreSQL to really race them)"""
+    CHECKOUTS = 24
+    LIMIT = 5
+
+    def test_concurrent_redemptions_respect_usage_limit(self):
+        now = timezone.now()
+        coupon = Coupon.objects.create(
+            code='RUSH', discount=10, usage_limit=self.LIMIT,
+            valid_from=now - timedelta(minutes=1), valid_to=now + timedelta(hours=1),
+        )
+        start = threading.Barrier(self.CHECKOUTS)
+        outcomes = {'redeemed': 0, 'rejected': 0}
+        outcomes_lock = threading.Lock()
+
+        def checkout():
+            start.wait()
+            try:
+                while True:
+                    try:
+                        # Stands in for the rest of the order's writes
+                        with transaction.atomic():
+                            redeem(coupon)
+                            time.sleep(0.002)
+                    except OperationalError:
+                        # SQLite turns away a second writer instead of queueing it; try again
+                        time.sleep(0.001)
+                        continue
+                    except CouponUnavailable:
+                        outcome = 'rejected'
+                    else:
+                        outcome = 'redeemed'
+                    break
+            finally:
+                connection.close()
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=checkout) for _ in range(self.CHECKOUTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        coupon.refresh_from_db()
+        self.assertLessEqual(coupon.used_count, coupon.usage_limit)
+        self.assertEqual(outcomes['redeemed'], coupon.used_count)
+        self.assertEqual(outcomes, {'redeemed': self.LIMIT, 'rejected': self.CHECKOUTS - self.LIMIT})
@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.cart_detail, name='cart_detail'),
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('update/<int:product_id>/', views.cart_update, name='cart_update'),
+    path('batch/', views.cart_batch, name='cart_batch'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('clear/', views.cart_clear, name='cart_clear'),
     path('coupon/apply/', views.coupon_apply, name='coupon_apply'),
@@ -1,41 +1,41 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib import messages
 from django.utils import timezone
 
+from shop.catalog import catalog
 from shop.models import Product
-from .cart import Cart
+from .cart import get_cart
+from .coupons import coupon_cache
 from .forms import CartAddProductForm, CouponApplyForm
-from .models import Coupon
+
+
+BATCH_MODES = ('add', 'set', 'remove')
+MAX_BATCH_OPERATIONS = 100
+MAX_LINE_QUANTITY = CartAddProductForm.base_fields['quantity'].max_value
 
 
 def cart_detail(request):
     """Display cart contents"""
-    cart = Cart(request)
+    cart = get_cart(request)
+    cart_changes = cart.reprice()
     coupon_form = CouponApplyForm()
     
     # Get applied coupon from session
     coupon_id = request.session.get('coupon_id')
     coupon = None
     if coupon_id:
-        try:
-            coupon = Coupon.objects.get(id=coupon_id)
-            if not coupon.is_valid():
-                del request.session['coupon_id']
-                coupon = None
-        except Coupon.DoesNotExist:
-            pass
-    
-    # Update cart item forms
-    for item in cart:
-        item['update_form'] = CartAddProductForm(initial={
-            'quantity': item['quantity'],
-            'update': True
-        })
+        coupon = coupon_cache.get_by_id(coupon_id)
+        if coupon is None or not coupon.is_valid():
+            del request.session['coupon_id']
+            coupon = None
     
     context = {
         'cart': cart,
+        'cart_changes': cart_changes,
         'coupon_form': coupon_form,
         'coupon': coupon,
     }
@@ -45,8 +45,8 @@ def cart_detail(request):
 @require_POST
 def cart_add(request, product_id):
     """Add product to cart"""
-    cart = Cart(request)
-    product = get_object_or_404(Product, id=product_id)
+    cart = get_cart(request)
+    product = catalog.get_or_404(product_id)
     
     form = CartAddProductForm(request.POST)
     if form.is_valid():
@@ -73,8 +73,8 @@ def cart_add(request, product_id):
 @require_POST
 def cart_update(request, product_id):
     """Update cart item quantity"""
-    cart = Cart(request)
-    product = get_object_or_404(Product, id=product_id)
+    cart = get_cart(request)
+    product = catalog.get_or_404(product_id)
     
     quantity = int(request.POST.get('quantity', 1))
     if quantity > 0:
@@ -92,9 +92,82 @@ def cart_update(request, product_id):
     return redirect('cart:cart_detail')
 
 
+@require_POST
+def cart_batch(request):
+    """Apply a JSON list of {product_id, quantity, mode} operations all at once, or none if any fails"""
+    try:
+        operations = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON.'}, status=400)
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'status': 'error', 'message': 'Expected a list of operations.'}, status=400)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {MAX_BATCH_OPERATIONS} operations per request.'
+        }, status=400)
+
+    cart = get_cart(request)
+    errors = []
+    parsed = []
+    for index, operation in enumerate(operations):
+        try:
+            product_id = int(operation['product_id'])
+            mode = operation.get('mode', 'add')
+            quantity = 0 if mode == 'remove' else int(operation.get('quantity', 1))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            errors.append({'index': index, 'error': 'Expected product_id and an integer quantity.'})
+            continue
+        if mode not in BATCH_MODES:
+            errors.append({'index': index, 'product_id': product_id, 'error': f'Unknown mode "{mode}".'})
+        elif quantity < (1 if mode == 'add' else 0):
+            errors.append({'index': index, 'product_id': product_id, 'error': 'Quantity is too small.'})
+        else:
+            parsed.append((index, product_id, mode, quantity))
+
+    # Fresh from the database: the stock check must not trust the catalog snapshot
+    products = Product.objects.only(
+        'id', 'name', 'price', 'discount_price', 'is_available', 'stock'
+    ).in_bulk({product_id for index, product_id, mode, quantity in parsed})
+
+    quantities = {}
+    for index, product_id, mode, quantity in parsed:
+        product = products.get(product_id)
+        if product is None:
+            errors.append({'index': index, 'product_id': product_id, 'error': 'Product not found.'})
+            continue
+        if mode == 'add':
+            current = quantities.get(product, cart.cart.get(str(product_id), {}).get('quantity', 0))
+            quantity += current
+        if quantity and not product.is_available:
+            errors.append({'index': index, 'product_id': product_id, 'error': f'{product.name} is not available.'})
+        elif quantity > MAX_LINE_QUANTITY:
+            errors.append({
+                'index': index, 'product_id': product_id,
+                'error': f'At most {MAX_LINE_QUANTITY} of {product.name} per order.'
+            })
+        elif quantity > product.stock:
+            errors.append({
+                'index': index, 'product_id': product_id,
+                'error': f'Only {product.stock} of {product.name} in stock.'
+            })
+        else:
+            quantities[product] = quantity
+
+    if not errors:
+        cart.apply(quantities)
+
+    return JsonResponse({
+        'status': 'error' if errors else 'success',
+        'errors': sorted(errors, key=lambda error: error['index']),
+        'cart_count': len(cart),
+        'cart_total': str(cart.get_total_price())
+    }, status=400 if errors else 200)
+
+
 def cart_remove(request, product_id):
     """Remove product from cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     product = get_object_or_404(Product, id=product_id)
     cart.remove(product)
     
@@ -112,7 +185,7 @@ def cart_remove(request, product_id):
 
 def cart_clear(request):
     """Clear entire cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     cart.clear()
     
     # Clear coupon as well
@@ -126,34 +199,26 @@ def cart_clear(request):
 @require_POST
 def coupon_apply(request):
     """Apply coupon to cart"""
-    cart = Cart(request)
+    cart = get_cart(request)
     form = CouponApplyForm(request.POST)
     
     if form.is_valid():
         code = form.cleaned_data['code']
-        now = timezone.now()
+        coupon = coupon_cache.get(code)
         
-        try:
-            coupon = Coupon.objects.get(
-                code__iexact=code,
-                valid_from__lte=now,
-                valid_to__gte=now,
-                is_active=True
-            )
-            
-            if coupon.used_count >= coupon.usage_limit:
-                messages.error(request, 'This coupon has reached its usage limit.')
-            elif cart.get_total_price() < coupon.min_order_value:
-                messages.error(
-                    request,
-                    f'Minimum order value of ₹{coupon.min_order_value} required for this coupon.'
-                )
-            else:
-                request.session['coupon_id'] = coupon.id
-                messages.success(request, f'Coupon "{code}" applied successfully! {coupon.discount}% off.')
-                
-        except Coupon.DoesNotExist:
+        if coupon is None or coupon.valid_from > timezone.now():
             messages.error(request, 'Invalid or expired coupon code.')
+        elif coupon.used_count >= coupon.usage_limit:
+            messages.error(request, 'This coupon has reached its usage limit.')
+        elif cart.get_total_price() < coupon.min_order_value:
+            messages.error(
+                request,
+                f'Minimum order value of ₹{coupon.min_order_value} required for this coupon.'
+            )
+        else:
+            request.session['coupon_id'] = coupon.id
+            limit = f' (up to ₹{coupon.max_discount})' if coupon.max_discount is not None else ''
+            messages.success(request, f'Coupon "{coupon.code}" applied successfully! {coupon.discount}% off{limit}.')
     
     return redirect('cart:cart_detail')
 
@@ -168,7 +233,7 @@ def coupon_remove(request):
 
 def cart_count(request):
     """AJAX endpoint for cart count"""
-    cart = Cart(request)
+    cart = get_cart(request)
     return JsonResponse({
         'count': len(cart),
         'total': str(cart.get_total_price())
@@ -0,0 +1,137 @@
+"""
+Per-view SQL query budgets.
+
+QueryBudgetMiddleware counts the queries, total database time and repeated
+statements of every request, and compares the count against the budget
+registered for the resolved view name in settings.QUERY_BUDGETS. Violations
+are logged to 'flower_shop.query_budget'; with QUERY_BUDGET_RAISE enabled (as
+in tests) they raise QueryBudgetExceeded instead, so an N+1 regression fails
+the test that requested the page.
+
+A view whose work grows with its input, such as checkout's stock UPDATE per
+cart line, registers its fixed cost and calls extend_budget for the rest.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('flower_shop.query_budget')
+
+# Literals and IN (...) lists vary between otherwise identical statements;
+# column lists are dropped so the FROM and WHERE clauses stay readable
+FINGERPRINT_PATTERNS = [
+    (re.compile(r'^SELECT (DISTINCT )?.*? FROM ', re.DOTALL), r'SELECT \1... FROM '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view or block ran more queries than its budget allows"""
+
+
+def fingerprint(sql):
+    """Normalize sql so repeats of the same statement compare equal"""
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryStats:
+    """Query count, database time and statement counts for one request or block"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """[(fingerprint, times)] for statements run more than once, most repeated first"""
+        fingerprints = Counter()
+        for sql, times in self.statements.items():
+            fingerprints[fingerprint(sql)] += times
+        return [(sql, times) for sql, times in fingerprints.most_common() if times > 1]
+
+    def describe(self, limit=3):
+        summary = f'{self.count} queries in {self.duration * 1000:.1f}ms'
+        for sql, times in self.duplicates()[:limit]:
+            summary += f'\n  {times}x {sql[:200]}'
+        return summary
+
+
+@contextmanager
+def record_queries():
+    """Record every query run on any database connection inside the block"""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+@contextmanager
+def max_queries(budget, label='block'):
+    """Test helper: raise QueryBudgetExceeded if the block runs more than budget queries"""
+    with record_queries() as stats:
+        yield stats
+    if stats.count > budget:
+        raise QueryBudgetExceeded(f'{label} exceeded its budget of {budget} queries: {stats.describe()}')
+
+
+def extend_budget(request, queries):
+    """Allow this request queries more than its view's budget, for work that scales with the input"""
+    request.query_budget_extra = getattr(request, 'query_budget_extra', 0) + queries
+
+
+def get_budget(view_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'QUERY_BUDGET_DEFAULT', None))
+
+
+class QueryBudgetMiddleware:
+    """Check each request's queries against the budget of the view that served it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', True):
+            return self.get_response(request)
+
+        with record_queries() as stats:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = get_budget(view_name) if view_name else None
+        if budget is not None:
+            budget += getattr(request, 'query_budget_extra', 0)
+        logger.debug('%s %s: %s', request.method, view_name or request.path, stats.describe(limit=0))
+
+        if budget is not None and stats.count > budget:
+            message = (
+                f'{view_name} exceeded its budget of {budget} queries '
+                f'({request.method} {request.path}): {stats.describe()}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
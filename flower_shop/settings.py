@@ -3,6 +3,7 @@ Django settings for flower_shop project.
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -43,7 +44,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'flower_shop.query_budget.QueryBudgetMiddleware',  # Outermost after security, so session and auth queries count
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'cart.middleware.CartCookieMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -146,3 +149,130 @@ DEFAULT_FROM_EMAIL = 'noreply@flowershop.com'
 
 # Payment Options
 ENABLE_COD = os.getenv('ENABLE_COD', 'True') == 'True'  # Set to False to disable Cash on Delivery
+
+# Product Search
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')  # 'postgres', 'python' or 'auto' (by database vendor)
+SEARCH_MAX_RESULTS = 1000
+SEARCH_INDEX_SYNC_INTERVAL = 5  # Seconds between delta syncs of the in-memory index
+SEARCH_INDEX_PRUNE_INTERVAL = 300  # Seconds between checks of the in-memory index for deleted products
+AUTOCOMPLETE_MAX_RESULTS = 8
+AUTOCOMPLETE_TAXONOMY_MAX_AGE = 30  # Seconds before category/flower type suggestions are rechecked
+
+# Catalog Pagination
+CATALOG_PAGINATION = os.getenv('CATALOG_PAGINATION', 'offset')  # 'offset' (page numbers) or 'cursor' (keyset)
+CATALOG_COUNT_CAP = 1000  # Cursor mode counts at most this many rows; None for exact, 0 to skip
+ORDER_HISTORY_PAGE_SIZE = 10  # Orders per page in a customer's order history, paged by cursor
+
+# Cache - shared between workers when REDIS_URL is set, otherwise per process
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+FRAGMENT_CACHE_TIMEOUT = 300  # Seconds; also bounds staleness when each worker has its own cache
+
+# In-memory Catalog Snapshot
+CATALOG_SNAPSHOT_MAX_AGE = 5  # Seconds a worker may serve products without checking for updates
+CATALOG_SNAPSHOT_FULL_RELOAD = 300  # Seconds between full reloads (picks up deletions)
+
+# SQL Query Budgets - max queries per request by view name, checked by QueryBudgetMiddleware
+QUERY_BUDGET_ENABLED = True
+# Raise QueryBudgetExceeded instead of logging; on under `manage.py test` (benchmark_endpoints turns it on too)
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', str(sys.argv[1:2] == ['test'])) == 'True'
+QUERY_BUDGET_DEFAULT = None  # Budget for views not listed below; None leaves them unchecked
+QUERY_BUDGETS = {
+    # Shop
+    'shop:home': 6,
+    'shop:product_list': 9,
+    'shop:product_list_by_category': 10,
+    'shop:product_detail': 9,
+    'shop:search': 6,
+    'shop:autocomplete': 4,  # Served from memory; a cold worker loads the catalog snapshot and the taxonomy (3) first
+    'shop:products_by_occasion': 7,
+    'shop:quick_view': 2,
+    'shop:add_to_wishlist': 6,
+    'shop:remove_from_wishlist': 6,
+    'shop:add_review': 10,
+    'shop:product_management': 11,
+    'shop:category_management': 6,
+    'shop:flower_type_management': 6,
+    'shop:order_management': 12,
+    'shop:order_detail_manage': 8,
+    'shop:order_update_status': 12,
+    'shop:order_add_tracking': 8,
+    'shop:settings_management': 6,
+    # Cart - CART_STORAGE = 'database' adds a line read and a write to each change
+    'cart:cart_detail': 6,
+    'cart:cart_add': 5,
+    'cart:cart_update': 6,
+    'cart:cart_batch': 8,
+    'cart:cart_remove': 6,
+    'cart:cart_clear': 5,
+    'cart:coupon_apply': 6,
+    'cart:coupon_remove': 3,
+    'cart:cart_count': 3,  # Session, user and, with database storage, one read of the stored lines
+    # Orders
+    'orders:checkout': 17,  # Plus one per product in the cart, for its conditional stock UPDATE (added by the view)
+    'orders:order_success': 6,
+    'orders:order_list': 4,  # Orders carry their item summary, so listing them is one query
+    'orders:order_detail': 6,
+    'orders:track_order': 6,
+    'orders:cancel_order': 12,  # Plus one per item, for returning its stock (added by the view)
+    'orders:check_pincode': 2,
+    'orders:delivery_slots': 2,
+    # Payments
+    'payments:payment_process': 6,
+    'payments:payment_callback': 13,  # Plus one per item, for confirming its reserved stock (added by the view)
+    'payments:payment_success': 6,
+    'payments:payment_failed': 4,
+    'payments:retry_payment': 6,
+    'payments:razorpay_webhook': 11,  # Plus one per item, as for the callback
+    # Accounts
+    'accounts:dashboard': 9,
+    'accounts:profile': 6,
+    'accounts:addresses': 5,
+    'accounts:order_history': 4,
+    'accounts:wishlist': 5,
+    'accounts:change_password': 4,
+}
+
+# Cart Storage
+CART_STORAGE = os.getenv('CART_STORAGE', 'session')  # 'session', 'database' (signed-in users' carts in StoredCartLine) or 'cookie'
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 60 * 60 * 24 * 30  # Seconds
+CART_COOKIE_MAX_SIZE = 1024  # Bytes; bigger carts overflow to the session
+
+# Coupons
+COUPON_CACHE_MAX_AGE = 30  # Seconds a worker may use its cached coupons before checking for edits
+
+# Stock Reservations
+STOCK_RESERVATION_TTL = 15 * 60  # Seconds stock is held for an unpaid online order before it is released
+
+# Order IDs
+# 0-31, different on every machine issuing orders; required unless DEBUG is on
+ORDER_ID_NODE = int(os.environ['ORDER_ID_NODE']) if 'ORDER_ID_NODE' in os.environ else (0 if DEBUG else None)
+ORDER_ID_LOCK_DIR = os.getenv('ORDER_ID_LOCK_DIR', '')  # Where processes lock their id slot; the temp dir if empty
+
+# Delivery Slots
+DELIVERY_SLOT_CAPACITY = 50  # Deliveries per time slot and date, unless a DeliverySlot row says otherwise
+DELIVERY_SLOT_DAYS = 7  # Days of availability returned by /orders/delivery-slots/
+
+# Pincode Serviceability
+# CSV of the pincodes we deliver to; the bundled file is a small sample, so it is only the default under DEBUG
+PINCODE_DATASET = os.getenv('PINCODE_DATASET', str(BASE_DIR / 'orders' / 'data' / 'pincodes.csv') if DEBUG else '')
+PINCODE_RELOAD_INTERVAL = 60  # Seconds between checks of the dataset file for changes
+
+# Order Notifications - emails queued as NotificationJob rows and sent by the send_notifications command
+NOTIFICATION_BATCH_SIZE = 100  # Emails sent per claimed batch over one mail connection
+NOTIFICATION_MAX_ATTEMPTS = 6  # Attempts before a job is marked failed
+NOTIFICATION_RETRY_DELAY = 60  # Seconds before the first retry; doubles with each attempt
+NOTIFICATION_CLAIM_TIMEOUT = 10 * 60  # Seconds a claimed batch is hidden from other workers
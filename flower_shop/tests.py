@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .query_budget import QueryBudgetExceeded, max_queries
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', 'customer@example.com')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_raises_under_test_runner(self):
+        self.assertTrue(settings.QUERY_BUDGET_RAISE)
+
+    @override_settings(QUERY_BUDGETS={'accounts:order_history': 1})
+    def test_view_over_budget_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'accounts:order_history exceeded its budget of 1'):
+            self.client.get(reverse('accounts:order_history'))
+
+    @override_settings(QUERY_BUDGETS={'accounts:order_history': 1}, QUERY_BUDGET_RAISE=False)
+    def test_view_over_budget_logs_when_not_raising(self):
+        with self.assertLogs('flower_shop.query_budget', 'WARNING') as logs:
+            response = self.client.get(reverse('accounts:order_history'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('accounts:order_history exceeded its budget of 1', logs.output[0])
+
+    def test_view_within_budget(self):
+        response = self.client.get(reverse('accounts:order_history'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_block_over_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with max_queries(1):
+                User.objects.count()
+                User.objects.count()
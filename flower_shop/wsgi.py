@@ -7,3 +7,13 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flower_shop.settings')
 application = get_wsgi_application()
+
+# Load the in-memory catalog and suggestions before this worker takes traffic;
+# both retry lazily on failure
+from django.db import DatabaseError  # noqa: E402
+from shop.autocomplete import autocomplete_index  # noqa: E402
+
+try:
+    autocomplete_index.refresh()
+except DatabaseError:
+    pass
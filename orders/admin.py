@@ -1,6 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils import timezone
-from .models import Address, Order, OrderItem, OrderTracking
+from .models import Address, DeliverySlot, NotificationJob, Order, OrderItem, OrderTracking, StockReservation
+from .services import STATUS_TRACKING, transition_orders
 
 
 class OrderItemInline(admin.TabularInline):
@@ -22,6 +23,16 @@ class AddressAdmin(admin.ModelAdmin):
     raw_id_fields = ['user']
 
 
+@admin.register(DeliverySlot)
+class DeliverySlotAdmin(admin.ModelAdmin):
+    list_display = ['date', 'time_slot', 'city', 'capacity', 'booked']
+    list_filter = ['time_slot', 'date']
+    search_fields = ['city']
+    list_editable = ['capacity']
+    readonly_fields = ['booked']
+    date_hierarchy = 'date'
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_id', 'user', 'full_name', 'total', 'status', 'payment_status', 'payment_method', 'created_at']
@@ -60,93 +71,53 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
     def save_model(self, request, obj, form, change):
-        """Auto-create tracking entry when status changes"""
+        """Status changes go through transition_orders so they are validated and tracked"""
         if change and 'status' in form.changed_data:
-            old_status = Order.objects.get(pk=obj.pk).status
             new_status = obj.status
-            
-            # Set delivered_at timestamp when delivered
-            if new_status == 'delivered' and not obj.delivered_at:
-                obj.delivered_at = timezone.now()
-            
+            obj.status = form.initial['status']
             super().save_model(request, obj, form, change)
-            
-            # Create tracking entry
-            status_messages = {
-                'confirmed': ('Order Confirmed', 'Your order has been confirmed and is being processed.'),
-                'processing': ('Order Processing', 'Your beautiful arrangement is being prepared with care.'),
-                'out_for_delivery': ('Out for Delivery', 'Your flowers are on the way! Our delivery partner will reach you soon.'),
-                'delivered': ('Delivered', 'Your order has been delivered successfully. Enjoy your flowers!'),
-                'cancelled': ('Order Cancelled', 'Your order has been cancelled.'),
-                'refunded': ('Order Refunded', 'Your payment has been refunded.'),
-            }
-            
-            if new_status in status_messages:
-                status_title, description = status_messages[new_status]
-                OrderTracking.objects.create(
-                    order=obj,
-                    status=status_title,
-                    description=description
-                )
+            self._update_status(request, Order.objects.filter(pk=obj.pk), new_status)
+            obj.refresh_from_db(fields=['status', 'delivered_at', 'updated_at'])
         else:
             super().save_model(request, obj, form, change)
 
-    def _update_status(self, request, queryset, status, status_title, description):
-        """Helper to update order status and create tracking"""
-        updated = 0
-        for order in queryset:
-            if order.status != status:
-                order.status = status
-                if status == 'delivered' and not order.delivered_at:
-                    order.delivered_at = timezone.now()
-                order.save()
-                OrderTracking.objects.create(
-                    order=order,
-                    status=status_title,
-                    description=description
-                )
-                updated += 1
-        self.message_user(request, f'{updated} order(s) marked as {status_title}.')
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Items edited in the inline change the summary shown in order listings
+        form.instance.refresh_summary()
+
+    def _update_status(self, request, queryset, status):
+        """Move the selected orders to status with one UPDATE and report any that can't make the move"""
+        selected = queryset.count()
+        moved = transition_orders(queryset, status)
+        status_title = STATUS_TRACKING[status][0]
+        self.message_user(request, f'{len(moved)} order(s) marked as {status_title}.')
+        if len(moved) < selected:
+            self.message_user(
+                request,
+                f'{selected - len(moved)} order(s) skipped: their current status does not allow {status_title}.',
+                messages.WARNING,
+            )
 
     @admin.action(description='Mark selected orders as Confirmed')
     def mark_confirmed(self, request, queryset):
-        self._update_status(
-            request, queryset, 'confirmed',
-            'Order Confirmed',
-            'Your order has been confirmed and is being processed.'
-        )
+        self._update_status(request, queryset, 'confirmed')
 
     @admin.action(description='Mark selected orders as Processing')
     def mark_processing(self, request, queryset):
-        self._update_status(
-            request, queryset, 'processing',
-            'Order Processing',
-            'Your beautiful arrangement is being prepared with care.'
-        )
+        self._update_status(request, queryset, 'processing')
 
     @admin.action(description='Mark selected orders as Out for Delivery')
     def mark_out_for_delivery(self, request, queryset):
-        self._update_status(
-            request, queryset, 'out_for_delivery',
-            'Out for Delivery',
-            'Your flowers are on the way! Our delivery partner will reach you soon.'
-        )
+        self._update_status(request, queryset, 'out_for_delivery')
 
     @admin.action(description='Mark selected orders as Delivered')
     def mark_delivered(self, request, queryset):
-        self._update_status(
-            request, queryset, 'delivered',
-            'Delivered',
-            'Your order has been delivered successfully. Enjoy your flowers!'
-        )
+        self._update_status(request, queryset, 'delivered')
 
     @admin.action(description='Mark selected orders as Cancelled')
     def mark_cancelled(self, request, queryset):
-        self._update_status(
-            request, queryset, 'cancelled',
-            'Order Cancelled',
-            'Your order has been cancelled.'
-        )
+        self._update_status(request, queryset, 'cancelled')
 
 
 @admin.register(OrderItem)
@@ -160,3 +131,32 @@ class OrderTrackingAdmin(admin.ModelAdmin):
     list_display = ['order', 'status', 'location', 'created_at']
     list_filter = ['status', 'created_at']
     raw_id_fields = ['order']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'product', 'quantity', 'status', 'expires_at', 'created_at']
+    list_filter = ['status', 'expires_at']
+    search_fields = ['order__order_id']
+    # Rows are written with the stock counters in orders.services; editing them here would unbalance those
+    readonly_fields = ['order', 'product', 'quantity', 'status', 'expires_at', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(NotificationJob)
+class NotificationJobAdmin(admin.ModelAdmin):
+    list_display = ['order', 'order_status', 'state', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['state', 'order_status']
+    search_fields = ['order__order_id', 'order__email']
+    raw_id_fields = ['order']
+    readonly_fields = ['attempts', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry']
+
+    @admin.action(description='Send selected emails again')
+    def retry(self, request, queryset):
+        updated = queryset.exclude(state='queued').update(
+            state='queued', attempts=0, next_attempt_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f'{updated} email(s) queued again.')
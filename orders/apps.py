@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from .ids import check_node
+        # Fail now rather than issue ids another machine may also be issuing
+        check_node(settings.ORDER_ID_NODE)
+        # The bundled sample would turn away most customers as undeliverable
+        if not settings.PINCODE_DATASET:
+            raise ImproperlyConfigured('Set PINCODE_DATASET to the pincode dataset CSV')
@@ -0,0 +1,89 @@
+"""
+Delivery slot capacity.
+
+Each DeliverySlot row counts the orders booked into one time slot on one
+date. A row with a city caps that city on its own; every other city shares
+the row with a blank city, which is created with DELIVERY_SLOT_CAPACITY the
+first time the slot is booked. Booking is a conditional UPDATE
+(booked < capacity) inside the order's transaction, so concurrent checkouts
+can never overbook a slot, and availability is read straight from the rows
+instead of counting orders.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DeliverySlot, normalize_city
+
+
+MAX_AVAILABILITY_DAYS = 30
+
+
+class SlotFull(Exception):
+    """The delivery slot has no capacity left"""
+
+
+def resolve_slot(date, time_slot, city):
+    """Id of the row capping deliveries to city in the slot, creating the shared row on first use"""
+    city = normalize_city(city)
+    rows = dict(
+        DeliverySlot.objects.filter(date=date, time_slot=time_slot, city__in={city, ''}).values_list('city', 'id')
+    )
+    if city in rows:
+        return rows[city]
+    if '' in rows:
+        return rows['']
+    DeliverySlot.objects.bulk_create([
+        DeliverySlot(date=date, time_slot=time_slot, city='', capacity=settings.DELIVERY_SLOT_CAPACITY)
+    ], ignore_conflicts=True)
+    return DeliverySlot.objects.filter(date=date, time_slot=time_slot, city='').values_list('id', flat=True).get()
+
+
+def book_slot(date, time_slot, city):
+    """Take one delivery in the slot and return its DeliverySlot id; raises SlotFull. Call inside the order's transaction"""
+    slot_id = resolve_slot(date, time_slot, city)
+    updated = DeliverySlot.objects.filter(pk=slot_id, booked__lt=F('capacity')).update(booked=F('booked') + 1)
+    if not updated:
+        raise SlotFull(f'{date} {time_slot} is fully booked')
+    return slot_id
+
+
+def rebook_slot(slot_id):
+    """Book a released delivery back regardless of capacity, for an order revived after it was paid"""
+    if slot_id:
+        DeliverySlot.objects.filter(pk=slot_id).update(booked=F('booked') + 1)
+
+
+def release_slots(slot_ids):
+    """Give back one delivery per id, for cancelled orders"""
+    for slot_id, count in sorted(Counter(slot_id for slot_id in slot_ids if slot_id).items()):
+        DeliverySlot.objects.filter(pk=slot_id, booked__gte=count).update(booked=F('booked') - count)
+
+
+def get_availability(city='', days=7, start=None):
+    """Remaining deliveries per time slot for days dates from start (tomorrow by default), in one query"""
+    city = normalize_city(city)
+    start = start or timezone.localdate() + timedelta(days=1)
+    end = start + timedelta(days=days - 1)
+    remaining = {}
+    rows = DeliverySlot.objects.filter(date__range=(start, end), city__in={city, ''}).values_list(
+        'date', 'time_slot', 'city', 'capacity', 'booked'
+    )
+    for date, time_slot, row_city, capacity, booked in rows:
+        # The city's own row wins over the shared one
+        if row_city or (date, time_slot) not in remaining:
+            remaining[date, time_slot] = max(capacity - booked, 0)
+
+    availability = []
+    for n in range(days):
+        date = start + timedelta(days=n)
+        slots = []
+        for time_slot, label in DeliverySlot.TIME_SLOT_CHOICES:
+            left = remaining.get((date, time_slot), settings.DELIVERY_SLOT_CAPACITY)
+            slots.append({'time_slot': time_slot, 'label': label, 'remaining': left, 'available': left > 0})
+        availability.append({'date': date.isoformat(), 'slots': slots})
+    return availability
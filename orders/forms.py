@@ -1,6 +1,7 @@
 from django import forms
 from django.conf import settings
-from .models import Address, Order
+from .models import Address, DeliverySlot, Order
+from .pincodes import pincode_index
 
 
 class AddressForm(forms.ModelForm):
@@ -56,15 +57,28 @@ class AddressForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # City and state can be left for clean() to fill in from a known pincode
+        self.fields['city'].required = False
+        self.fields['state'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        serviceable = pincode_index.get(cleaned_data.get('pincode', ''))
+        for field in ('city', 'state'):
+            if cleaned_data.get(field):
+                continue
+            if serviceable is not None:
+                cleaned_data[field] = getattr(serviceable, field)
+            elif field not in self.errors:
+                self.add_error(field, 'This field is required.')
+        return cleaned_data
+
 
 class CheckoutForm(forms.Form):
     """Checkout form"""
-    DELIVERY_TIME_CHOICES = [
-        ('09:00-12:00', '9:00 AM - 12:00 PM'),
-        ('12:00-15:00', '12:00 PM - 3:00 PM'),
-        ('15:00-18:00', '3:00 PM - 6:00 PM'),
-        ('18:00-21:00', '6:00 PM - 9:00 PM'),
-    ]
+    DELIVERY_TIME_CHOICES = DeliverySlot.TIME_SLOT_CHOICES
     
     address = forms.ModelChoiceField(
         queryset=Address.objects.none(),
@@ -0,0 +1,140 @@
+"""
+Order ids.
+
+An order id is "FS" followed by a 63-bit number in 13 Crockford base32
+characters (no I, L, O or U, so ids read aloud or retyped stay unambiguous):
+
+    41 bits  milliseconds since ORDER_ID_EPOCH (good for 69 years)
+     5 bits  node, from ORDER_ID_NODE; give every machine its own
+     6 bits  process slot, claimed per process on the node
+    11 bits  sequence within the millisecond (2048 ids/ms per process)
+
+The width is fixed, so ids sort in the order they were issued. Nothing is
+shared between processes at issue time: a process claims a slot once by
+taking an exclusive lock on one of ORDER_ID_SLOTS lock files in
+ORDER_ID_LOCK_DIR, and holds it until it exits, when the operating system
+drops the lock. Node, slot, millisecond and sequence together are unique, so
+two processes can never issue the same id. If the clock steps back, ids keep
+counting from the last millisecond used instead of repeating. ORDER_ID_NODE
+has no default outside DEBUG, since two machines on the same node would issue
+the same ids; the orders app refuses to start without it.
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the process id
+    fcntl = None
+
+
+ORDER_ID_PREFIX = 'FS'
+ORDER_ID_EPOCH = 1735689600000  # 2025-01-01 UTC, in milliseconds
+
+NODE_BITS = 5
+SLOT_BITS = 6
+SEQUENCE_BITS = 11
+ORDER_ID_SLOTS = 1 << SLOT_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ID_LENGTH = 13
+
+
+def encode(number):
+    chars = []
+    for _ in range(ID_LENGTH):
+        number, digit = divmod(number, 32)
+        chars.append(ALPHABET[digit])
+    return ORDER_ID_PREFIX + ''.join(reversed(chars))
+
+
+def decode(order_id):
+    """Split an id into (issued at in ms since the Unix epoch, node, slot, sequence)"""
+    number = 0
+    for char in order_id[len(ORDER_ID_PREFIX):]:
+        number = number * 32 + ALPHABET.index(char)
+    sequence = number & MAX_SEQUENCE
+    number >>= SEQUENCE_BITS
+    slot = number & (ORDER_ID_SLOTS - 1)
+    number >>= SLOT_BITS
+    node = number & ((1 << NODE_BITS) - 1)
+    return (number >> NODE_BITS) + ORDER_ID_EPOCH, node, slot, sequence
+
+
+def check_node(node):
+    if node is None:
+        raise ImproperlyConfigured('Set ORDER_ID_NODE to a number from 0 to 31, different on every machine')
+    if not 0 <= node < 1 << NODE_BITS:
+        raise ImproperlyConfigured(f'ORDER_ID_NODE must be between 0 and {(1 << NODE_BITS) - 1}')
+
+
+def claim_slot(lock_dir=None):
+    """Lock the first free slot file and return (slot, open lock file); the lock lasts until the file is closed"""
+    if fcntl is None:
+        return os.getpid() % ORDER_ID_SLOTS, None
+    lock_dir = lock_dir or getattr(settings, 'ORDER_ID_LOCK_DIR', '') or tempfile.gettempdir()
+    for slot in range(ORDER_ID_SLOTS):
+        lock_file = open(os.path.join(lock_dir, f'flower-shop-order-id-{slot}.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return slot, lock_file
+    raise ImproperlyConfigured(f'All {ORDER_ID_SLOTS} order id slots in {lock_dir} are taken')
+
+
+class OrderIdGenerator:
+    """Issues unique, time-ordered order ids for one process"""
+
+    def __init__(self, node=None, slot=None):
+        self.lock = threading.Lock()
+        self.node = node
+        self.slot = slot
+        self.lock_file = None
+        self.prefix_bits = None
+        self.last_ms = -1
+        self.sequence = 0
+
+    def setup(self):
+        if self.node is None:
+            self.node = getattr(settings, 'ORDER_ID_NODE', None)
+        check_node(self.node)
+        if self.slot is None:
+            self.slot, self.lock_file = claim_slot()
+        self.prefix_bits = (self.node << SLOT_BITS | self.slot) << SEQUENCE_BITS
+
+    def next_number(self):
+        with self.lock:
+            if self.prefix_bits is None:
+                self.setup()
+            now = int(time.time() * 1000) - ORDER_ID_EPOCH
+            if now > self.last_ms:
+                self.last_ms, self.sequence = now, 0
+            elif self.sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock stepped back: carry on from the last one used
+                self.sequence += 1
+            else:
+                # Sequence used up; borrow the next millisecond rather than wait for it
+                self.last_ms, self.sequence = self.last_ms + 1, 0
+            return self.last_ms << (NODE_BITS + SLOT_BITS + SEQUENCE_BITS) | self.prefix_bits | self.sequence
+
+    def __call__(self):
+        return encode(self.next_number())
+
+    def reset(self):
+        """Forget the slot; a forked child shares its parent's lock and must claim its own"""
+        self.__init__()
+
+
+generate_order_id = OrderIdGenerator()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=generate_order_id.reset)
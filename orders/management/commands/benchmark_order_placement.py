@@ -0,0 +1,160 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from cart.cart import CartLine
+from orders.delivery import resolve_slot
+from orders.models import Address, DeliverySlot, Order, OrderItem, OrderTracking
+from orders.services import InsufficientStock, place_order
+from shop.cache import bump_stock_version
+from shop.management.commands.benchmark_endpoints import percentile
+from shop.models import Product
+
+
+def legacy_place_order(user, lines, address, **details):
+    """The checkout before orders.services: autocommit writes and stock decremented in Python"""
+    subtotal = sum(line.total_price for line in lines)
+    order = Order.objects.create(
+        user=user, full_name=address.full_name, email=user.email, phone=address.phone,
+        address_line1=address.address_line1, city=address.city, state=address.state,
+        pincode=address.pincode, subtotal=subtotal, total=subtotal, **details
+    )
+    for line in lines:
+        product = Product.objects.get(pk=line.product_id)
+        OrderItem.objects.create(
+            order=order, product=product, product_name=product.name,
+            price=line.price, quantity=line.quantity
+        )
+        product.stock -= line.quantity
+        product.save()
+    OrderTracking.objects.create(order=order, status='Order Placed')
+    return order
+
+
+class Command(BaseCommand):
+    help = 'Place orders from concurrent threads and check stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=400, help='Checkouts attempted in total')
+        parser.add_argument('--products', type=int, default=5, help='Products the checkouts compete for')
+        parser.add_argument('--stock', type=int, default=200, help='Starting stock of each product')
+        parser.add_argument('--max-quantity', type=int, default=3)
+        parser.add_argument('--legacy', action='store_true',
+                            help='Use the old per-line checkout writes for comparison')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializes every write; run against PostgreSQL for meaningful numbers'
+            ))
+        address = Address.objects.select_related('user').filter(user__email__gt='').first()
+        if address is None:
+            raise CommandError('Need a customer with an address - run seed_benchmark_data first')
+        products = list(Product.objects.filter(is_available=True).order_by('id')[:options['products']])
+        if len(products) < options['products']:
+            raise CommandError(f'Need {options["products"]} available products')
+
+        original_stock = {product.id: product.stock for product in products}
+        Product.objects.filter(id__in=original_stock).update(stock=options['stock'])
+        place = legacy_place_order if options['legacy'] else place_order
+        details = {
+            'delivery_date': timezone.localdate() + timedelta(days=1),
+            'delivery_time_slot': '12:00-15:00',
+        }
+        # Every checkout books the same delivery slot; make room for all of them
+        slot = DeliverySlot.objects.get(
+            pk=resolve_slot(details['delivery_date'], details['delivery_time_slot'], address.city)
+        )
+        DeliverySlot.objects.filter(pk=slot.pk).update(capacity=slot.booked + options['orders'])
+
+        remaining = [options['orders']]
+        lock = threading.Lock()
+        outcomes, timings, order_ids = Counter(), [], []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                while True:
+                    with lock:
+                        if not remaining[0]:
+                            return
+                        remaining[0] -= 1
+                    lines = [
+                        CartLine(product.id, product, rng.randint(1, options['max_quantity']), product.final_price)
+                        for product in rng.sample(products, rng.randint(1, len(products)))
+                    ]
+                    started = time.perf_counter()
+                    try:
+                        order = place(address.user, lines, address, **details)
+                        outcome = 'placed'
+                    except InsufficientStock:
+                        order, outcome = None, 'out of stock'
+                    except DatabaseError:
+                        order, outcome = None, 'database error'
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        outcomes[outcome] += 1
+                        timings.append(elapsed * 1000)
+                        if order is not None:
+                            order_ids.append(order.id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(options['seed'] + n,)) for n in range(options['threads'])]
+        # Orders from a failed legacy checkout are left behind; catch them by id range
+        first_id = (Order.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            self.report(options, products, outcomes, timings, elapsed, first_id)
+        finally:
+            Order.objects.filter(id__gte=first_id, user=address.user).delete()
+            DeliverySlot.objects.filter(pk=slot.pk).update(capacity=slot.capacity, booked=slot.booked)
+            for product_id, stock in original_stock.items():
+                Product.objects.filter(id=product_id).update(stock=stock)
+            bump_stock_version()
+
+    def report(self, options, products, outcomes, timings, elapsed, first_id):
+        timings.sort()
+        self.stdout.write(
+            f'{sum(outcomes.values())} checkouts on {options["threads"]} threads in {elapsed:.2f}s '
+            f'({outcomes["placed"] / elapsed:.1f} orders/s); p50 {percentile(timings, 0.5):.1f}ms, '
+            f'p95 {percentile(timings, 0.95):.1f}ms'
+        )
+        self.stdout.write('  ' + ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items())))
+
+        orders = Order.objects.filter(id__gte=first_id)
+        sold = dict(
+            OrderItem.objects.filter(order__in=orders).values_list('product').annotate(total=Sum('quantity'))
+        )
+        stock = dict(Product.objects.filter(id__in=[product.id for product in products]).values_list('id', 'stock'))
+        problems = []
+        for product in products:
+            expected = options['stock'] - sold.get(product.id, 0)
+            self.stdout.write(
+                f'  product {product.id}: sold {sold.get(product.id, 0)}, stock {stock[product.id]} '
+                f'(expected {expected})'
+            )
+            if stock[product.id] != expected or stock[product.id] < 0:
+                problems.append(f'product {product.id} stock {stock[product.id]} != {expected}')
+        orphans = orders.filter(items__isnull=True).count()
+        if orphans:
+            problems.append(f'{orphans} orders without items')
+
+        if problems:
+            raise CommandError('Inconsistent stock: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('✅ Stock matches the orders placed; nothing oversold'))
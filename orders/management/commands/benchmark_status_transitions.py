@@ -0,0 +1,63 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flower_shop.query_budget import record_queries
+from orders.ids import generate_order_id
+from orders.models import Order, OrderTracking
+from orders.services import STATUS_TRACKING, transition_orders
+
+
+BENCH_USERNAME = 'status-transition-bench'
+DISPATCH = ['confirmed', 'processing', 'out_for_delivery', 'delivered']
+
+
+def legacy_update_status(queryset, status):
+    """The admin actions before transition_orders: a save and a tracking insert per order"""
+    title, description = STATUS_TRACKING[status]
+    for order in queryset:
+        if order.status != status:
+            order.status = status
+            order.save()
+            OrderTracking.objects.create(order=order, status=title, description=description)
+
+
+class Command(BaseCommand):
+    help = "Time moving a morning's orders through dispatch with the bulk status service"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--legacy', action='store_true', help='Use the old per-order saves for comparison')
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create_user(BENCH_USERNAME, f'{BENCH_USERNAME}@example.com')
+        try:
+            Order.objects.bulk_create([
+                Order(
+                    order_id=generate_order_id(), user=user, full_name='Bench Customer', email=user.email,
+                    phone='9000000000', address_line1='1 Market Road', city='Delhi', state='Delhi',
+                    pincode='110001', subtotal=Decimal('500'), total=Decimal('500'),
+                )
+                for _ in range(options['orders'])
+            ])
+            orders = Order.objects.filter(user=user)
+            for status in DISPATCH:
+                started = time.perf_counter()
+                with record_queries() as queries:
+                    if options['legacy']:
+                        legacy_update_status(orders, status)
+                    else:
+                        transition_orders(orders, status)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'  {status:<17} {elapsed * 1000:8.1f}ms {queries.count:6} queries')
+
+            delivered = orders.filter(status='delivered', delivered_at__isnull=False).count()
+            tracked = OrderTracking.objects.filter(order__user=user).count()
+            if delivered != options['orders'] and not options['legacy']:
+                raise CommandError(f'Only {delivered} of {options["orders"]} orders were delivered')
+            self.stdout.write(f'{options["orders"]} orders delivered, {tracked} tracking entries written')
+        finally:
+            user.delete()
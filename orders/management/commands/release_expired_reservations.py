@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.services import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release stock held for online orders whose payment window has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Holds released per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep sweeping every this many seconds instead of exiting (run as a worker)')
+
+    def handle(self, *args, **options):
+        while True:
+            released = cancelled = 0
+            while True:
+                holds, orders = release_expired_reservations(options['batch_size'])
+                released += holds
+                cancelled += orders
+                if holds < options['batch_size']:
+                    break
+            if released or options['verbosity'] > 1:
+                self.stdout.write(f'Released {released} expired holds, cancelled {cancelled} unpaid orders')
+            if not options['interval']:
+                return
+            # Don't keep a connection open between sweeps
+            connection.close()
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.notifications import send_notifications
+
+
+class Command(BaseCommand):
+    help = 'Send the order emails waiting in the notification outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE,
+                            help='Emails claimed and sent over one mail connection at a time')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep polling every this many seconds instead of exiting (run as a worker)')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = skipped = failed = 0
+            while True:
+                batch = send_notifications(options['batch_size'])
+                sent += batch[0]
+                skipped += batch[1]
+                failed += batch[2]
+                if sum(batch) < options['batch_size']:
+                    break
+            if sent or skipped or failed or options['verbosity'] > 1:
+                self.stdout.write(f'Sent {sent} emails, skipped {skipped}, {failed} failed')
+            if not options['interval']:
+                return
+            # Don't keep a connection open between polls
+            connection.close()
+            time.sleep(options['interval'])
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def book_existing_orders(apps, schema_editor):
+    """Count orders already placed for upcoming dates against their slots, so the slots don't overbook"""
+    DeliverySlot = apps.get_model('orders', 'DeliverySlot')
+    Order = apps.get_model('orders', 'Order')
+    time_slots = [value for value, _ in DeliverySlot._meta.get_field('time_slot').choices]
+    orders = Order.objects.filter(
+        delivery_date__gte=timezone.localdate(),
+        delivery_time_slot__in=time_slots,
+        status__in=['pending', 'confirmed', 'processing', 'out_for_delivery'],
+    )
+    counts = orders.values_list('delivery_date', 'delivery_time_slot').annotate(total=Count('id')).order_by()
+    # No city has its own slot yet, so every order books the shared row, as resolve_slot would
+    for date, time_slot, total in counts:
+        slot = DeliverySlot.objects.create(
+            date=date, time_slot=time_slot, city='', capacity=settings.DELIVERY_SLOT_CAPACITY, booked=total
+        )
+        orders.filter(delivery_date=date, delivery_time_slot=time_slot).update(delivery_slot=slot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_slot', models.CharField(choices=[('09:00-12:00', '9:00 AM - 12:00 PM'), ('12:00-15:00', '12:00 PM - 3:00 PM'), ('15:00-18:00', '3:00 PM - 6:00 PM'), ('18:00-21:00', '6:00 PM - 9:00 PM')], max_length=20)),
+                ('city', models.CharField(blank=True, help_text='Leave blank to set the capacity shared by cities without their own slots', max_length=100)),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'time_slot', 'city'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'time_slot', 'city'), name='unique_delivery_slot')],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_slot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.deliveryslot'),
+        ),
+        migrations.RunPython(book_existing_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    order_ids = Order.objects.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(order_ids.filter(id__gt=last_id)[:2000])
+        if not batch:
+            break
+        last_id = batch[-1]
+        counts = dict(
+            OrderItem.objects.filter(order_id__in=batch).values_list('order').annotate(total=Sum('quantity'))
+        )
+        first_items = {}
+        # Walk backwards so each order ends up with its first item; older items have no image of their own
+        for order_id, name, image, product_image in OrderItem.objects.filter(order_id__in=batch).order_by(
+            '-id'
+        ).values_list('order_id', 'product_name', 'product_image', 'product__image'):
+            first_items[order_id] = (name, image or product_image)
+        orders = []
+        for order_id in batch:
+            name, image = first_items.get(order_id, ('', None))
+            orders.append(Order(
+                id=order_id, item_count=counts.get(order_id, 0), first_item_name=name, first_item_image=image
+            ))
+        Order.objects.bulk_update(orders, ['item_count', 'first_item_name', 'first_item_image'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_deliveryslot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='first_item_image',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='order_items/'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='first_item_name',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+        ),
+        migrations.RunPython(fill_order_summaries, migrations.RunPython.noop),
+    ]
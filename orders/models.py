@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from shop.models import Product
-import uuid
+from .ids import generate_order_id
 
 
 class Address(models.Model):
@@ -38,6 +39,44 @@ class Address(models.Model):
         super().save(*args, **kwargs)
 
 
+def normalize_city(city):
+    return ' '.join(city.split()).lower()
+
+
+class DeliverySlot(models.Model):
+    """Orders booked into one delivery time slot on one date, for one city or all cities without their own row"""
+    TIME_SLOT_CHOICES = [
+        ('09:00-12:00', '9:00 AM - 12:00 PM'),
+        ('12:00-15:00', '12:00 PM - 3:00 PM'),
+        ('15:00-18:00', '3:00 PM - 6:00 PM'),
+        ('18:00-21:00', '6:00 PM - 9:00 PM'),
+    ]
+
+    date = models.DateField()
+    time_slot = models.CharField(max_length=20, choices=TIME_SLOT_CHOICES)
+    city = models.CharField(max_length=100, blank=True,
+                            help_text='Leave blank to set the capacity shared by cities without their own slots')
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'time_slot', 'city']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'time_slot', 'city'], name='unique_delivery_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.time_slot} {self.city or 'all cities'}: {self.booked}/{self.capacity}"
+
+    def save(self, *args, **kwargs):
+        self.city = normalize_city(self.city)
+        super().save(*args, **kwargs)
+
+    @property
+    def remaining(self):
+        return max(self.capacity - self.booked, 0)
+
+
 class Order(models.Model):
     """Order model"""
     ORDER_STATUS_CHOICES = [
@@ -104,10 +143,17 @@ class Order(models.Model):
     # Delivery details
     delivery_date = models.DateField(null=True, blank=True)
     delivery_time_slot = models.CharField(max_length=50, blank=True)
+    delivery_slot = models.ForeignKey(DeliverySlot, related_name='orders', on_delete=models.SET_NULL,
+                                      null=True, blank=True, editable=False)
     special_instructions = models.TextField(blank=True)
     gift_message = models.TextField(blank=True)
     is_gift = models.BooleanField(default=False)
     
+    # Summary of the items, kept on the order so listings don't load them
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    first_item_name = models.CharField(max_length=200, blank=True, editable=False)
+    first_item_image = models.ImageField(upload_to='order_items/', blank=True, null=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -115,17 +161,34 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A customer's order history, newest first, paged by keyset
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_id}"
 
     def save(self, *args, **kwargs):
         if not self.order_id:
-            self.order_id = f"FS{uuid.uuid4().hex[:8].upper()}"
+            self.order_id = generate_order_id()
         super().save(*args, **kwargs)
 
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
+
+    def set_summary(self, items):
+        """Fill the item summary from the order's items, in the order they were added"""
+        items = list(items)
+        self.item_count = sum(item.quantity for item in items)
+        first = items[0] if items else None
+        self.first_item_name = first.product_name if first else ''
+        self.first_item_image = first.product_image if first else None
+
+    def refresh_summary(self):
+        """Recompute the item summary after the items were edited directly"""
+        self.set_summary(self.items.order_by('id'))
+        self.save(update_fields=['item_count', 'first_item_name', 'first_item_image'])
 
 
 class OrderItem(models.Model):
@@ -157,3 +220,58 @@ class OrderTracking(models.Model):
 
     def __str__(self):
         return f"{self.order.order_id} - {self.status}"
+
+
+class StockReservation(models.Model):
+    """Stock held for an order until its online payment completes or the hold expires"""
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('confirmed', 'Confirmed'),
+        ('released', 'Released'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='reservations', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.order.order_id} - {self.quantity}x product {self.product_id} ({self.status})"
+
+
+class NotificationJob(models.Model):
+    """An order email waiting in the outbox for the send_notifications worker"""
+    STATE_CHOICES = [
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, related_name='notifications', on_delete=models.CASCADE)
+    order_status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Payment callback and webhook may both confirm an order; it is announced once
+            models.UniqueConstraint(fields=['order', 'order_status'], name='unique_order_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['state', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.order.order_id} - {self.order_status} ({self.state})"
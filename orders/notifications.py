@@ -0,0 +1,141 @@
+"""
+Order emails.
+
+Requests never talk to the mail server. Confirming, moving or cancelling an
+order inserts NotificationJob rows (one INSERT for any number of orders) in
+the same transaction as the change, so an email is queued exactly when the
+change commits. The send_notifications command works through the outbox: it
+claims a batch of due jobs, renders them and sends them over one mail
+connection. A failed job is retried after NOTIFICATION_RETRY_DELAY seconds,
+doubling each time, and given up on after NOTIFICATION_MAX_ATTEMPTS.
+Customers who turned off order notifications have their jobs skipped.
+
+A claimed job is pushed NOTIFICATION_CLAIM_TIMEOUT seconds into the future
+before it is sent, so several workers can run side by side and a worker that
+dies mid-batch only delays its jobs.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import NotificationJob
+
+
+logger = logging.getLogger(__name__)
+
+# Statuses the customer hears about; an order waiting for payment has nothing to announce yet
+NOTIFIED_STATUSES = {'confirmed', 'processing', 'out_for_delivery', 'delivered', 'cancelled', 'refunded'}
+
+# Template (without extension) per order status; the rest share the status update
+TEMPLATES = {
+    'confirmed': 'orders/emails/order_confirmed',
+    'delivered': 'orders/emails/order_delivered',
+}
+STATUS_TEMPLATE = 'orders/emails/order_status'
+
+
+def queue_notifications(order_ids, order_status):
+    """Queue the email announcing order_status for each order; call inside the transaction making the change"""
+    if order_status not in NOTIFIED_STATUSES:
+        return
+    NotificationJob.objects.bulk_create([
+        NotificationJob(order_id=order_id, order_status=order_status) for order_id in order_ids
+    ], ignore_conflicts=True)
+
+
+def claim_jobs(limit):
+    """Ids of up to limit due jobs, hidden from other workers until the claim times out"""
+    now = timezone.now()
+    with transaction.atomic():
+        job_ids = list(
+            NotificationJob.objects.select_for_update(skip_locked=True)
+            .filter(state='queued', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        NotificationJob.objects.filter(id__in=job_ids).update(
+            attempts=F('attempts') + 1,
+            next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT),
+        )
+    return job_ids
+
+
+def render_message(job, connection=None):
+    order = job.order
+    template = TEMPLATES.get(job.order_status, STATUS_TEMPLATE)
+    context = {
+        'order': order,
+        'items': order.items.all(),
+        'status': dict(order.ORDER_STATUS_CHOICES)[job.order_status],
+        'order_status': job.order_status,
+    }
+    subject = ' '.join(render_to_string(f'{template}_subject.txt', context).split())
+    message = EmailMultiAlternatives(
+        subject, render_to_string(f'{template}.txt', context), to=[order.email], connection=connection
+    )
+    message.attach_alternative(render_to_string(f'{template}.html', context), 'text/html')
+    return message
+
+
+def _retry(job, error):
+    """Schedule the job's next attempt with exponential backoff, or fail it for good"""
+    if job.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        logger.error('Giving up on %s after %d attempts: %s', job, job.attempts, error)
+        changes = {'state': 'failed'}
+    else:
+        delay = settings.NOTIFICATION_RETRY_DELAY * 2 ** (job.attempts - 1)
+        changes = {'next_attempt_at': timezone.now() + timedelta(seconds=delay)}
+    NotificationJob.objects.filter(pk=job.pk).update(last_error=str(error)[:1000], **changes)
+
+
+def send_notifications(limit=None):
+    """Send one batch of due emails; returns (sent, skipped, failed)"""
+    job_ids = claim_jobs(limit or settings.NOTIFICATION_BATCH_SIZE)
+    if not job_ids:
+        return 0, 0, 0
+    jobs = list(
+        NotificationJob.objects.filter(id__in=job_ids)
+        .select_related('order__user__profile')
+        .prefetch_related('order__items')
+        .order_by('id')
+    )
+
+    sent, skipped, failed = [], [], []
+    due = []
+    for job in jobs:
+        profile = getattr(job.order.user, 'profile', None)
+        if profile is not None and not profile.order_notifications:
+            skipped.append(job.pk)
+        else:
+            due.append(job)
+
+    if due:
+        try:
+            connection = get_connection()
+            # One connection for the whole batch instead of a login per email
+            with connection:
+                for job in due:
+                    try:
+                        render_message(job, connection).send()
+                    except Exception as error:
+                        failed.append((job, error))
+                    else:
+                        sent.append(job.pk)
+        except Exception as error:
+            # Could not reach the mail server; whatever wasn't sent waits for the next attempt
+            failed_ids = {job.pk for job, _ in failed}
+            failed += [(job, error) for job in due if job.pk not in sent and job.pk not in failed_ids]
+
+    now = timezone.now()
+    NotificationJob.objects.filter(id__in=sent).update(state='sent', sent_at=now, last_error='')
+    NotificationJob.objects.filter(id__in=skipped).update(state='skipped')
+    for job, error in failed:
+        _retry(job, error)
+    return len(sent), len(skipped), len(failed)
@@ -0,0 +1,152 @@
+"""
+Pincode serviceability index.
+
+The dataset at PINCODE_DATASET is a CSV with the columns pincode, city,
+state, zone, delivery_days and same_day. Each worker loads it into a few
+parallel arrays sorted by pincode - about 8 bytes a pincode, with the
+(city, state, zone) strings shared between pincodes - and looks pincodes up
+with a binary search. The file's modification time is checked at most every
+PINCODE_RELOAD_INTERVAL seconds and a changed file is reloaded and swapped in
+whole, so replace it with a rename rather than rewriting it in place.
+PINCODE_DATASET only defaults to the bundled sample under DEBUG; elsewhere the
+orders app refuses to start until it points at the real dataset.
+"""
+
+import csv
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELIVERY_DAYS = 2
+TRUE_VALUES = {'1', 'y', 'yes', 'true'}
+
+
+class Serviceability:
+    """Delivery details for one pincode"""
+    __slots__ = ('pincode', 'city', 'state', 'zone', 'delivery_days', 'same_day')
+
+    def __init__(self, pincode, city, state, zone, delivery_days, same_day):
+        self.pincode = pincode
+        self.city = city
+        self.state = state
+        self.zone = zone
+        self.delivery_days = delivery_days
+        self.same_day = same_day
+
+
+class PincodeData:
+    """One loaded dataset: parallel arrays indexed by position in the sorted pincodes"""
+    __slots__ = ('pincodes', 'places', 'place_ids', 'delivery_days', 'same_day')
+
+    def __init__(self, rows=()):
+        rows = sorted(rows)
+        place_index = {}
+        self.pincodes = array('I', (row[0] for row in rows))
+        self.places = []
+        place_ids = []
+        for _, city, state, zone, _, _ in rows:
+            place = (city, state, zone)
+            if place not in place_index:
+                place_index[place] = len(self.places)
+                self.places.append(place)
+            place_ids.append(place_index[place])
+        self.place_ids = array('H' if len(self.places) <= 0xFFFF else 'I', place_ids)
+        self.delivery_days = array('B', (row[4] for row in rows))
+        self.same_day = bytes(row[5] for row in rows)
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    def get(self, pincode):
+        index = bisect_left(self.pincodes, pincode)
+        if index == len(self.pincodes) or self.pincodes[index] != pincode:
+            return None
+        city, state, zone = self.places[self.place_ids[index]]
+        return Serviceability(
+            f'{pincode:06d}', city, state, zone, self.delivery_days[index], bool(self.same_day[index])
+        )
+
+
+def load_dataset(path):
+    """Read the CSV into a PincodeData, skipping malformed rows"""
+    rows, skipped = {}, 0
+    with open(path, newline='', encoding='utf-8') as dataset:
+        for row in csv.DictReader(dataset):
+            try:
+                pincode = int(row['pincode'])
+                if not 100000 <= pincode <= 999999:
+                    raise ValueError(pincode)
+                delivery_days = int(row.get('delivery_days') or DEFAULT_DELIVERY_DAYS)
+                if not 0 <= delivery_days <= 255:
+                    raise ValueError(delivery_days)
+                city, state = row['city'].strip(), row['state'].strip()
+            except (KeyError, TypeError, ValueError, AttributeError):
+                skipped += 1
+                continue
+            same_day = (row.get('same_day') or '').strip().lower() in TRUE_VALUES
+            rows[pincode] = (pincode, city, state, (row.get('zone') or '').strip(), delivery_days, same_day)
+    if skipped:
+        logger.warning('Skipped %d malformed rows in %s', skipped, path)
+    return PincodeData(rows.values())
+
+
+class PincodeIndex:
+    """Per-worker pincode lookups, reloaded when the dataset file changes"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = PincodeData()
+        self.stamp = None
+        self.checked_at = None
+
+    def get(self, pincode):
+        """Serviceability for a 6-digit pincode string, or None if we don't deliver there"""
+        pincode = str(pincode).strip()
+        if len(pincode) != 6 or not pincode.isdigit():
+            return None
+        self.refresh()
+        return self.data.get(int(pincode))
+
+    def __len__(self):
+        self.refresh()
+        return len(self.data)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        max_age = getattr(settings, 'PINCODE_RELOAD_INTERVAL', 60)
+        if not force and self.checked_at is not None and now - self.checked_at < max_age:
+            return
+        with self.lock:
+            self.checked_at = now
+            path = self.path or settings.PINCODE_DATASET
+            if not path:
+                raise ImproperlyConfigured('Set PINCODE_DATASET to the pincode dataset CSV')
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if self.stamp is not False:
+                    logger.warning('Pincode dataset %s not found; no pincodes are serviceable', path)
+                    self.data, self.stamp = PincodeData(), False
+                return
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp == self.stamp:
+                return
+            try:
+                self.data = load_dataset(path)
+            except (OSError, UnicodeDecodeError, csv.Error, ValueError, OverflowError):
+                logger.exception('Could not load pincode dataset %s; keeping the previous one', path)
+                return
+            self.stamp = stamp
+
+
+pincode_index = PincodeIndex()
@@ -0,0 +1,313 @@
+"""
+Order placement.
+
+place_order writes an order in a single transaction: the coupon is redeemed,
+stock is taken, then the order, its items and tracking rows are inserted with
+one statement each. Stock is decremented in the database with a conditional
+UPDATE per line (stock >= quantity), so two checkouts can never both take the
+last units, and a line without enough stock rolls the whole order back before
+anything is left half-written. An order with a delivery date and time slot
+also books the slot (orders.delivery), raising SlotFull when it has no
+capacity left.
+
+Orders paid online are placed before the customer pays, so their stock is
+only reserved: it moves from Product.stock to Product.reserved_stock and a
+StockReservation row records the hold. Product.stock stays the available
+counter, so in_stock never has to sum reservations. Payment confirmation
+clears reserved_stock; release_expired_reservations, run by the
+release_expired_reservations command, puts the stock of holds older than
+STOCK_RESERVATION_TTL back and cancels their unpaid orders.
+
+Staff move orders through their statuses with transition_orders, which
+changes any number of orders with one UPDATE and one tracking INSERT.
+Every change the customer should hear about queues its email in the same
+transaction (orders.notifications).
+"""
+
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from cart.coupons import redeem
+from shop.cache import bump_stock_version
+from shop.catalog import catalog
+from shop.models import Product
+from .delivery import book_slot, rebook_slot, release_slots
+from .models import Order, OrderItem, OrderTracking, StockReservation
+from .notifications import queue_notifications
+
+
+FREE_DELIVERY_THRESHOLD = 500
+DELIVERY_CHARGE = 50
+
+# Orders only move forward; cancelling puts the stock back and refunds follow a delivery or cancellation
+ALLOWED_TRANSITIONS = {
+    'pending': {'confirmed', 'processing', 'out_for_delivery', 'delivered', 'cancelled'},
+    'confirmed': {'processing', 'out_for_delivery', 'delivered', 'cancelled'},
+    'processing': {'out_for_delivery', 'delivered', 'cancelled'},
+    'out_for_delivery': {'delivered', 'cancelled'},
+    'delivered': {'refunded'},
+    'cancelled': {'refunded'},
+    'refunded': set(),
+}
+
+# Tracking entry (status, description) written when an order reaches each status
+STATUS_TRACKING = {
+    'pending': ('Order Pending', 'Order is waiting to be processed.'),
+    'confirmed': ('Order Confirmed', 'Your order has been confirmed and is being processed.'),
+    'processing': ('Order Processing', 'Your beautiful arrangement is being prepared with care.'),
+    'out_for_delivery': ('Out for Delivery', 'Your flowers are on the way! Our delivery partner will reach you soon.'),
+    'delivered': ('Delivered', 'Your order has been delivered successfully. Enjoy your flowers!'),
+    'cancelled': ('Order Cancelled', 'Your order has been cancelled.'),
+    'refunded': ('Order Refunded', 'Your payment has been refunded.'),
+}
+
+
+class InsufficientStock(Exception):
+    """Some lines ask for more than is in stock"""
+
+    def __init__(self, product_ids):
+        super().__init__(f'Insufficient stock for products {product_ids}')
+        self.product_ids = product_ids
+
+
+def get_delivery_charge(subtotal):
+    return 0 if subtotal >= FREE_DELIVERY_THRESHOLD else DELIVERY_CHARGE
+
+
+def _stock_changed(product_ids):
+    """Refresh catalog caches once the transaction commits; update() skips the signals that do it"""
+    def refresh():
+        bump_stock_version()
+        catalog.reload(list(product_ids))
+    transaction.on_commit(refresh)
+
+
+def take_stock(quantities, reserve=False):
+    """Decrement stock for {product_id: quantity}, raising InsufficientStock unless every line has enough"""
+    now = timezone.now()
+    changes = {'updated_at': now}
+    short = []
+    # A fixed lock order keeps checkouts sharing products from deadlocking
+    for product_id, quantity in sorted(quantities.items()):
+        if reserve:
+            changes['reserved_stock'] = F('reserved_stock') + quantity
+        updated = Product.objects.filter(pk=product_id, stock__gte=quantity).update(
+            stock=F('stock') - quantity, **changes
+        )
+        if not updated:
+            short.append(product_id)
+    if short:
+        raise InsufficientStock(short)
+    _stock_changed(quantities)
+
+
+def return_stock(quantities, reserved=False):
+    """Add {product_id: quantity} back to stock, taking it out of reserved_stock if it was held"""
+    now = timezone.now()
+    for product_id, quantity in sorted(quantities.items()):
+        changes = {'reserved_stock': F('reserved_stock') - quantity} if reserved else {}
+        Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity, updated_at=now, **changes)
+    _stock_changed(quantities)
+
+
+def _quantities(reservations):
+    quantities = Counter()
+    for reservation in reservations:
+        quantities[reservation.product_id] += reservation.quantity
+    return quantities
+
+
+def _set_status(reservations, status):
+    StockReservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).update(status=status)
+
+
+def place_order(user, lines, address, coupon=None, payment_method='cod', **details):
+    """Create the order for cart lines; raises InsufficientStock, CouponUnavailable or SlotFull and writes nothing"""
+    lines = list(lines)
+    subtotal = sum((line.total_price for line in lines), Decimal('0'))
+    discount = coupon.get_discount(subtotal) if coupon else Decimal('0')
+    delivery_charge = get_delivery_charge(subtotal)
+    quantities = {}
+    for line in lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+
+    # Cash on delivery needs no payment step, so those orders are confirmed straight away
+    confirmed = payment_method == 'cod'
+    with transaction.atomic():
+        if coupon:
+            redeem(coupon)
+        if details.get('delivery_date') and details.get('delivery_time_slot'):
+            details['delivery_slot_id'] = book_slot(
+                details['delivery_date'], details['delivery_time_slot'], address.city
+            )
+        take_stock(quantities, reserve=not confirmed)
+
+        items = [
+            OrderItem(
+                product_id=line.product_id,
+                product_name=line.product.name,
+                product_image=line.product.image,
+                price=line.price,
+                quantity=line.quantity,
+            )
+            for line in lines
+        ]
+        order = Order(
+            user=user,
+            full_name=address.full_name,
+            email=user.email,
+            phone=address.phone,
+            address_line1=address.address_line1,
+            address_line2=address.address_line2,
+            landmark=address.landmark,
+            city=address.city,
+            state=address.state,
+            pincode=address.pincode,
+            subtotal=subtotal,
+            discount=discount,
+            delivery_charge=delivery_charge,
+            total=subtotal - discount + delivery_charge,
+            coupon_code=coupon.code if coupon else '',
+            coupon_discount=discount,
+            status='confirmed' if confirmed else 'pending',
+            payment_method=payment_method,
+            **details
+        )
+        order.set_summary(items)
+        order.save()
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        tracking = [OrderTracking(
+            order=order,
+            status='Order Placed',
+            description='Your order has been placed successfully.'
+        )]
+        if confirmed:
+            tracking.append(OrderTracking(
+                order=order,
+                status='Order Confirmed',
+                description='Your order has been confirmed. We will deliver it on the scheduled date.'
+            ))
+        OrderTracking.objects.bulk_create(tracking)
+        if confirmed:
+            queue_notifications([order.id], 'confirmed')
+        else:
+            expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+            StockReservation.objects.bulk_create([
+                StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+                for product_id, quantity in quantities.items()
+            ])
+    return order
+
+
+def _keep_held_stock(reservations):
+    """Count held stock as sold: it leaves reserved_stock and the holds can no longer expire"""
+    for product_id, quantity in sorted(_quantities(reservations).items()):
+        Product.objects.filter(pk=product_id).update(reserved_stock=F('reserved_stock') - quantity)
+    _set_status(reservations, 'confirmed')
+
+
+def confirm_reservations(order):
+    """Keep the stock held for a paid order; raises InsufficientStock if its expired hold has since sold out"""
+    with transaction.atomic():
+        reservations = list(order.reservations.select_for_update().exclude(status='confirmed'))
+        held = [reservation for reservation in reservations if reservation.status == 'held']
+        released = [reservation for reservation in reservations if reservation.status == 'released']
+        _keep_held_stock(held)
+        # The customer paid after the sweeper gave the stock back; take it again if it is still there
+        if released:
+            take_stock(_quantities(released))
+            rebook_slot(order.delivery_slot_id)
+            _set_status(released, 'confirmed')
+
+
+def restock_orders(order_ids):
+    """Put cancelled orders' stock back, releasing the holds of those whose payment never completed"""
+    reservations = list(StockReservation.objects.select_for_update().filter(order_id__in=order_ids))
+    held = [reservation for reservation in reservations if reservation.status == 'held']
+    if held:
+        return_stock(_quantities(held), reserved=True)
+        _set_status(held, 'released')
+    # Orders without a hold took their stock outright; an expired hold already gave it back
+    settled = {reservation.order_id for reservation in reservations if reservation.status != 'confirmed'}
+    quantities = Counter()
+    items = OrderItem.objects.filter(order_id__in=set(order_ids) - settled, product__isnull=False)
+    for product_id, quantity in items.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    if quantities:
+        return_stock(quantities)
+
+
+def transition_orders(orders, status, description=''):
+    """Move orders to status in one UPDATE and return the ids moved; orders that may not make the move are skipped"""
+    sources = [source for source, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+    title, default_description = STATUS_TRACKING[status]
+    now = timezone.now()
+    with transaction.atomic():
+        moving = dict(
+            orders.order_by().filter(status__in=sources).select_for_update().values_list('id', 'delivery_slot_id')
+        )
+        if not moving:
+            return []
+        changes = {'status': status, 'updated_at': now}
+        if status == 'delivered':
+            changes['delivered_at'] = Coalesce('delivered_at', Value(now))
+        Order.objects.filter(id__in=moving).update(**changes)
+        if status == 'cancelled':
+            restock_orders(list(moving))
+            release_slots(moving.values())
+        else:
+            # Unpaid online orders staff move on keep their stock; the sweeper must not release it
+            _keep_held_stock(list(
+                StockReservation.objects.select_for_update().filter(order_id__in=moving, status='held')
+            ))
+        OrderTracking.objects.bulk_create([
+            OrderTracking(order_id=order_id, status=title, description=description or default_description)
+            for order_id in moving
+        ])
+        queue_notifications(moving, status)
+    return list(moving)
+
+
+def release_expired_reservations(limit=500):
+    """Release up to limit expired holds and cancel their unpaid orders; returns (holds released, orders cancelled)"""
+    now = timezone.now()
+    with transaction.atomic():
+        # Only orders still waiting for payment give their stock back. The joined orders are locked
+        # too, so holds a payment confirmation or transition_orders is settling are skipped
+        expired = list(
+            StockReservation.objects.select_for_update(skip_locked=True)
+            .filter(status='held', expires_at__lte=now, order__status='pending')
+            .exclude(order__payment_status='paid')
+            .order_by('expires_at')[:limit]
+        )
+        if not expired:
+            return 0, 0
+        return_stock(_quantities(expired), reserved=True)
+        _set_status(expired, 'released')
+
+        orders = Order.objects.filter(
+            id__in={reservation.order_id for reservation in expired}, status='pending'
+        ).exclude(payment_status='paid')
+        cancelled = dict(orders.values_list('id', 'delivery_slot_id'))
+        order_ids = list(cancelled)
+        Order.objects.filter(id__in=order_ids).update(status='cancelled', updated_at=now)
+        release_slots(cancelled.values())
+        OrderTracking.objects.bulk_create([
+            OrderTracking(
+                order_id=order_id,
+                status='Order Cancelled',
+                description='Payment was not completed in time, so the order has been cancelled.'
+            )
+            for order_id in order_ids
+        ])
+        queue_notifications(order_ids, 'cancelled')
+    return len(expired), len(order_ids)
@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from shop.models import Category, Product
+from .ids import MAX_SEQUENCE, ORDER_ID_EPOCH, OrderIdGenerator, decode, generate_order_id
+from .models import Order, OrderItem
+from .pincodes import PincodeIndex, load_dataset
+
+
+def issue_ids(count):
+    """Ids from this process's generator, in the order it issued them"""
+    return [generate_order_id() for _ in range(count)]
+
+
+class OrderIdTests(SimpleTestCase):
+    def assert_increasing(self, ids):
+        self.assertTrue(all(a < b for a, b in zip(ids, ids[1:])), 'order ids went backwards')
+
+    def test_unique_and_ordered_across_threads(self):
+        generator = OrderIdGenerator(node=1, slot=0)
+        results = [None] * 8
+
+        def worker(n):
+            results[n] = [generator() for _ in range(5000)]
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(len(results))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for ids in results:
+            self.assert_increasing(ids)
+        issued = [order_id for ids in results for order_id in ids]
+        self.assertEqual(len(set(issued)), len(issued))
+
+    @skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_unique_and_ordered_across_forked_processes(self):
+        with tempfile.TemporaryDirectory() as lock_dir, override_settings(ORDER_ID_LOCK_DIR=lock_dir):
+            generate_order_id.reset()
+            try:
+                # The parent holds a slot before forking; each child must claim its own
+                parent_id = generate_order_id()
+                with multiprocessing.get_context('fork').Pool(4) as pool:
+                    results = pool.map(issue_ids, [5000] * 4)
+            finally:
+                generate_order_id.reset()
+        for ids in results:
+            self.assert_increasing(ids)
+        issued = [parent_id] + [order_id for ids in results for order_id in ids]
+        self.assertEqual(len(set(issued)), len(issued))
+        slots = {decode(ids[0])[2] for ids in results}
+        self.assertEqual(len(slots), 4)
+        self.assertNotIn(decode(parent_id)[2], slots)
+
+    def test_exhausted_sequence_borrows_next_millisecond(self):
+        generator = OrderIdGenerator(node=1, slot=2)
+        now = (ORDER_ID_EPOCH + 1000) / 1000
+        with mock.patch('orders.ids.time.time', return_value=now):
+            ids = [generator() for _ in range(MAX_SEQUENCE + 2)]
+        self.assert_increasing(ids)
+        self.assertEqual(decode(ids[MAX_SEQUENCE]), (ORDER_ID_EPOCH + 1000, 1, 2, MAX_SEQUENCE))
+        self.assertEqual(decode(ids[-1]), (ORDER_ID_EPOCH + 1001, 1, 2, 0))
+
+    def test_clock_step_back_keeps_counting(self):
+        generator = OrderIdGenerator(node=1, slot=2)
+        with mock.patch('orders.ids.time.time', return_value=(ORDER_ID_EPOCH + 5000) / 1000):
+            before = generator()
+        with mock.patch('orders.ids.time.time', return_value=(ORDER_ID_EPOCH + 2000) / 1000):
+            after = generator()
+        self.assertLess(before, after)
+        self.assertEqual(decode(after), (ORDER_ID_EPOCH + 5000, 1, 2, 1))
+
+
+class PincodeDatasetTests(SimpleTestCase):
+    def write_dataset(self, directory, rows):
+        path = os.path.join(directory, 'pincodes.csv')
+        with open(path, 'w') as dataset:
+            dataset.write('pincode,city,state,zone,delivery_days,same_day\n')
+            dataset.writelines(f'{row}\n' for row in rows)
+        return path
+
+    def test_out_of_range_delivery_days_are_malformed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            data = load_dataset(self.write_dataset(directory, [
+                '110001,New Delhi,Delhi,North,1,yes',
+                '110002,New Delhi,Delhi,North,-1,no',
+                '110003,New Delhi,Delhi,North,256,no',
+            ]))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data.get(110001).delivery_days, 1)
+        self.assertIsNone(data.get(110002))
+
+    def test_unset_dataset_fails_loudly(self):
+        with override_settings(PINCODE_DATASET=''), self.assertRaises(ImproperlyConfigured):
+            PincodeIndex().get('110001')
+
+
+class OrderHistoryQueriesTests(TestCase):
+    """The order history pages cost the same however many orders a customer has"""
+    # Session, user, then one query for the page of orders with their item summaries
+    QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Birthday', slug='birthday')
+        cls.products = [
+            Product.objects.create(
+                category=category, name=f'Bouquet {n}', slug=f'bouquet-{n}',
+                description='Fresh flowers', price=Decimal('499.00'), image='products/bouquet.jpg',
+            )
+            for n in range(3)
+        ]
+        cls.user = User.objects.create_user('customer', 'customer@example.com')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_orders(self, count):
+        orders = []
+        for _ in range(count):
+            order = Order(
+                order_id=generate_order_id(), user=self.user, full_name='Customer', email=self.user.email,
+                phone='9000000000', address_line1='1 Market Road', city='Delhi', state='Delhi',
+                pincode='110001', subtotal=Decimal('0'), total=Decimal('0'),
+            )
+            items = [
+                OrderItem(product=product, product_name=product.name, price=product.price, quantity=1)
+                for product in self.products
+            ]
+            order.set_summary(items)
+            orders.append((order, items))
+        Order.objects.bulk_create([order for order, _ in orders])
+        for order, items in orders:
+            for item in items:
+                item.order = order
+        OrderItem.objects.bulk_create([item for _, items in orders for item in items])
+
+    def assert_pages_constant(self, view):
+        url = reverse(view)
+        self.add_orders(1)
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['orders']), 1)
+
+        self.add_orders(25)
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(url)
+        page = response.context['orders']
+        self.assertTrue(page.has_next())
+        # Later cursor pages cost the same as the first
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(url + page.next_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['orders'].has_next())
+
+    def test_order_list(self):
+        self.assert_pages_constant('orders:order_list')
+
+    def test_order_history(self):
+        self.assert_pages_constant('accounts:order_history')
@@ -12,4 +12,5 @@ urlpatterns = [
     path('track/<str:order_id>/', views.track_order, name='track_order'),
     path('cancel/<str:order_id>/', views.cancel_order, name='cancel_order'),
     path('check-pincode/', views.check_pincode, name='check_pincode'),
+    path('delivery-slots/', views.delivery_slots, name='delivery_slots'),
 ]
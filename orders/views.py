@@ -2,37 +2,52 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
 
-from cart.cart import Cart
-from cart.models import Coupon
+from cart.cart import get_cart
+from cart.coupons import CouponUnavailable, coupon_cache
+from flower_shop.query_budget import extend_budget
 from shop.models import SiteSettings
-from .models import Address, Order, OrderItem, OrderTracking
+from shop.pagination import KeysetPaginator
+from .models import Address, Order
 from .forms import AddressForm, CheckoutForm
+from .delivery import MAX_AVAILABILITY_DAYS, SlotFull, get_availability
+from .pincodes import pincode_index
+from .services import InsufficientStock, place_order, transition_orders
 
 
 @login_required
 def checkout(request):
     """Checkout page"""
-    cart = Cart(request)
+    cart = get_cart(request)
     site_settings = SiteSettings.load()
     
     if len(cart) == 0:
         messages.warning(request, 'Your cart is empty!')
         return redirect('shop:home')
     
+    # Revalidate prices and stock before showing totals or writing anything
+    changes = cart.reprice()
+    if any(change.blocks_checkout for change in changes):
+        messages.error(request, 'Some items in your cart need your attention before checkout.')
+        return redirect('cart:cart_detail')
+    for change in changes:
+        messages.warning(request, change.message)
+    if changes and request.method == 'POST':
+        # The totals the customer confirmed are out of date
+        return redirect('orders:checkout')
+    
     addresses = Address.objects.filter(user=request.user)
     
     # Get coupon if applied
     coupon_id = request.session.get('coupon_id')
     coupon = None
     if coupon_id:
-        try:
-            coupon = Coupon.objects.get(id=coupon_id)
-        except Coupon.DoesNotExist:
-            pass
+        coupon = coupon_cache.get_by_id(coupon_id)
+        if coupon is None or not coupon.is_valid() or cart.get_total_price() < coupon.min_order_value:
+            del request.session['coupon_id']
+            coupon = None
+            messages.warning(request, 'Your coupon no longer applies to this order and was removed.')
     
     if request.method == 'POST':
         form = CheckoutForm(request.user, site_settings.enable_cod, request.POST)
@@ -43,62 +58,33 @@ def checkout(request):
                 messages.error(request, 'Cash on Delivery is currently not available.')
                 return redirect('orders:checkout')
             
-            address = form.cleaned_data['address']
-            
-            # Calculate totals
-            subtotal = cart.get_total_price()
-            discount = cart.get_discount(coupon)
-            delivery_charge = 0 if subtotal >= 500 else 50
-            total = subtotal - discount + delivery_charge
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                full_name=address.full_name,
-                email=request.user.email,
-                phone=address.phone,
-                address_line1=address.address_line1,
-                address_line2=address.address_line2,
-                landmark=address.landmark,
-                city=address.city,
-                state=address.state,
-                pincode=address.pincode,
-                subtotal=subtotal,
-                discount=discount,
-                delivery_charge=delivery_charge,
-                total=total,
-                coupon_code=coupon.code if coupon else '',
-                coupon_discount=discount,
-                delivery_date=form.cleaned_data['delivery_date'],
-                delivery_time_slot=form.cleaned_data['delivery_time_slot'],
-                special_instructions=form.cleaned_data.get('special_instructions', ''),
-                is_gift=form.cleaned_data.get('is_gift', False),
-                gift_message=form.cleaned_data.get('gift_message', ''),
-                payment_method=form.cleaned_data.get('payment_method', 'razorpay'),
-            )
-            
-            # Create order items
-            for item in cart:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item['product'],
-                    product_name=item['product'].name,
-                    product_image=item['product'].image,
-                    price=item['price'],
-                    quantity=item['quantity']
+            # Stock is taken with one conditional UPDATE per product
+            extend_budget(request, len({line.product_id for line in cart}))
+            try:
+                order = place_order(
+                    request.user,
+                    cart,
+                    form.cleaned_data['address'],
+                    coupon=coupon,
+                    payment_method=payment_method,
+                    delivery_date=form.cleaned_data['delivery_date'],
+                    delivery_time_slot=form.cleaned_data['delivery_time_slot'],
+                    special_instructions=form.cleaned_data.get('special_instructions', ''),
+                    is_gift=form.cleaned_data.get('is_gift', False),
+                    gift_message=form.cleaned_data.get('gift_message', ''),
                 )
-                
-                # Update stock
-                product = item['product']
-                product.stock -= item['quantity']
-                product.save()
-            
-            # Create tracking entry
-            OrderTracking.objects.create(
-                order=order,
-                status='Order Placed',
-                description='Your order has been placed successfully.'
-            )
+            except CouponUnavailable:
+                del request.session['coupon_id']
+                messages.error(request, f'Coupon "{coupon.code}" has just run out. Please review your order.')
+                return redirect('orders:checkout')
+            except InsufficientStock as e:
+                for item in cart:
+                    if item.product_id in e.product_ids:
+                        messages.error(request, f'{item.product.name} sold out while you were checking out.')
+                return redirect('cart:cart_detail')
+            except SlotFull:
+                messages.error(request, 'That delivery slot has just filled up. Please choose another.')
+                return redirect('orders:checkout')
             
             # Store order ID in session for payment
             request.session['order_id'] = order.id
@@ -110,13 +96,6 @@ def checkout(request):
             
             # Redirect based on payment method
             if order.payment_method == 'cod':
-                order.status = 'confirmed'
-                order.save()
-                OrderTracking.objects.create(
-                    order=order,
-                    status='Order Confirmed',
-                    description='Your order has been confirmed. We will deliver it on the scheduled date.'
-                )
                 return redirect('orders:order_success', order_id=order.order_id)
             else:
                 return redirect('payments:payment_process')
@@ -181,7 +160,11 @@ def add_address(request):
 @login_required
 def order_success(request, order_id):
     """Order success page"""
-    order = get_object_or_404(Order, order_id=order_id, user=request.user)
+    order = get_object_or_404(
+        Order.objects.prefetch_related('items__product'),
+        order_id=order_id,
+        user=request.user
+    )
     
     context = {
         'order': order,
@@ -191,8 +174,10 @@ def order_success(request, order_id):
 
 @login_required
 def order_list(request):
-    """List all orders for user"""
-    orders = Order.objects.filter(user=request.user)
+    """List the user's orders, newest first, a page at a time"""
+    orders = KeysetPaginator(
+        Order.objects.filter(user=request.user), settings.ORDER_HISTORY_PAGE_SIZE, count_cap=0
+    ).get_page(request)
     
     context = {
         'orders': orders,
@@ -203,7 +188,11 @@ def order_list(request):
 @login_required
 def order_detail(request, order_id):
     """Order detail view"""
-    order = get_object_or_404(Order, order_id=order_id, user=request.user)
+    order = get_object_or_404(
+        Order.objects.prefetch_related('items__product'),
+        order_id=order_id,
+        user=request.user
+    )
     
     context = {
         'order': order,
@@ -229,22 +218,10 @@ def cancel_order(request, order_id):
     """Cancel order"""
     order = get_object_or_404(Order, order_id=order_id, user=request.user)
     
-    if order.status in ['pending', 'confirmed']:
-        order.status = 'cancelled'
-        order.save()
-        
-        # Restore stock
-        for item in order.items.all():
-            if item.product:
-                item.product.stock += item.quantity
-                item.product.save()
-        
-        OrderTracking.objects.create(
-            order=order,
-            status='Order Cancelled',
-            description='Order has been cancelled by the customer.'
-        )
-        
+    # Returning stock runs one UPDATE per product; item_count is an upper bound that costs no query
+    extend_budget(request, order.item_count)
+    cancellable = Order.objects.filter(pk=order.pk, status__in=['pending', 'confirmed'])
+    if transition_orders(cancellable, 'cancelled', 'Order has been cancelled by the customer.'):
         messages.success(request, 'Order cancelled successfully.')
     else:
         messages.error(request, 'This order cannot be cancelled.')
@@ -254,21 +231,40 @@ def cancel_order(request, order_id):
 
 def check_pincode(request):
     """Check delivery availability by pincode"""
-    pincode = request.GET.get('pincode', '')
-    
-    # Simulated delivery check - in production, integrate with actual delivery API
-    available_pincodes = ['110001', '110002', '110003', '400001', '400002', '560001', '560002']
+    pincode = request.GET.get('pincode', '').strip()
     
     if len(pincode) == 6 and pincode.isdigit():
-        is_available = pincode in available_pincodes or int(pincode) % 2 == 0  # Simplified logic
+        serviceable = pincode_index.get(pincode)
+        if serviceable is None:
+            return JsonResponse({
+                'available': False,
+                'message': 'Sorry, delivery not available in this area.',
+                'delivery_days': None,
+            })
         
+        days = serviceable.delivery_days
         return JsonResponse({
-            'available': is_available,
-            'message': 'Delivery available!' if is_available else 'Sorry, delivery not available in this area.',
-            'delivery_days': '2-3 days' if is_available else None
+            'available': True,
+            'message': 'Same-day delivery available!' if serviceable.same_day else 'Delivery available!',
+            'delivery_days': f'{days} day' if days == 1 else f'{days} days',
+            'same_day': serviceable.same_day,
+            'city': serviceable.city,
+            'state': serviceable.state,
+            'zone': serviceable.zone,
         })
     
     return JsonResponse({
         'available': False,
         'message': 'Please enter a valid 6-digit pincode.'
     })
+
+
+def delivery_slots(request):
+    """Delivery slot availability for the coming days"""
+    try:
+        days = int(request.GET.get('days', settings.DELIVERY_SLOT_DAYS))
+    except ValueError:
+        days = settings.DELIVERY_SLOT_DAYS
+    days = min(max(days, 1), MAX_AVAILABILITY_DAYS)
+    city = request.GET.get('city', '')
+    return JsonResponse({'city': city, 'days': get_availability(city, days)})
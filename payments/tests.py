@@ -0,0 +1,67 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from cart.cart import CartLine
+from orders.models import Address, NotificationJob, Order
+from orders.services import place_order, transition_orders
+from shop.models import Category, Product
+
+
+class PaymentCapturedTests(TestCase):
+    """A captured payment settles its order once, however often and late it is reported"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Birthday', slug='birthday')
+        cls.product = Product.objects.create(
+            category=category, name='Bouquet', slug='bouquet', description='Fresh flowers',
+            price=Decimal('499.00'), stock=10, image='products/bouquet.jpg',
+        )
+        cls.user = User.objects.create_user('customer', 'customer@example.com')
+        cls.address = Address.objects.create(
+            user=cls.user, full_name='Customer', phone='9000000000', address_line1='1 Market Road',
+            city='Delhi', state='Delhi', pincode='110001',
+        )
+
+    def setUp(self):
+        line = CartLine(self.product.id, self.product, 2, self.product.final_price)
+        self.order = place_order(self.user, [line], self.address, payment_method='razorpay')
+        Order.objects.filter(pk=self.order.pk).update(razorpay_order_id='order_test')
+
+    def captured(self):
+        entity = {'order_id': 'order_test', 'id': 'pay_test'}
+        payload = {'event': 'payment.captured', 'payload': {'payment': {'entity': entity}}}
+        return self.client.post(
+            reverse('payments:razorpay_webhook'), json.dumps(payload), content_type='application/json'
+        )
+
+    def assert_stock(self, stock, reserved_stock):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved_stock), (stock, reserved_stock))
+
+    def test_duplicate_webhook_settles_once(self):
+        self.captured()
+        self.captured()
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.status, order.payment_status), ('confirmed', 'paid'))
+        self.assertEqual(order.tracking.filter(status='Payment Received').count(), 1)
+        self.assertEqual(NotificationJob.objects.filter(order=order).count(), 1)
+        self.assert_stock(8, 0)
+
+    def test_late_webhook_keeps_status_staff_set(self):
+        self.captured()
+        transition_orders(Order.objects.filter(pk=self.order.pk), 'processing')
+        self.captured()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'processing')
+        self.assert_stock(8, 0)
+
+    def test_payment_for_order_staff_moved_on_keeps_its_status(self):
+        transition_orders(Order.objects.filter(pk=self.order.pk), 'processing')
+        self.captured()
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.status, order.payment_status), ('processing', 'paid'))
+        self.assert_stock(8, 0)
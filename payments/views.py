@@ -6,8 +6,12 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.conf import settings
 from django.contrib import messages
+from django.db import transaction
 
+from flower_shop.query_budget import extend_budget
 from orders.models import Order, OrderTracking
+from orders.notifications import queue_notifications
+from orders.services import InsufficientStock, confirm_reservations
 from .models import Payment
 
 
@@ -15,6 +19,54 @@ from .models import Payment
 razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
 
+def hold_stock(order):
+    """Confirm the stock reserved for a paid order; False if its hold expired and the stock has sold out"""
+    try:
+        confirm_reservations(order)
+    except InsufficientStock:
+        OrderTracking.objects.create(
+            order=order,
+            status='Refund Pending',
+            description='Payment arrived after your items were released and they have since sold out. '
+                        'Your payment will be refunded.'
+        )
+        return False
+    return True
+
+
+def settle_payment(order, payment_id, signature=''):
+    """Mark a captured payment's order paid; returns (locked order, whether this call paid it)
+
+    The callback and the webhook both report the same payment, in either order
+    and possibly late, so only the first settles it. An order staff already
+    moved on keeps its status; only one still waiting for payment, or cancelled
+    for lack of it, is confirmed (or cancelled for a refund if its stock is gone).
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.payment_status == 'paid':
+            return order, False
+        order.payment_status = 'paid'
+        order.razorpay_payment_id = payment_id
+        if signature:
+            order.razorpay_signature = signature
+        tracking = [OrderTracking(
+            order=order, status='Payment Received', description=f'Payment of ₹{order.total} received via Razorpay.'
+        )]
+        if order.status in ('pending', 'cancelled'):
+            order.status = 'confirmed' if hold_stock(order) else 'cancelled'
+            # Confirmation, or the cancellation with its refund
+            queue_notifications([order.id], order.status)
+            if order.status == 'confirmed':
+                tracking.append(OrderTracking(
+                    order=order, status='Order Confirmed',
+                    description='Your order has been confirmed and is being processed.'
+                ))
+        order.save()
+        OrderTracking.objects.bulk_create(tracking)
+    return order, True
+
+
 @login_required
 def payment_process(request):
     """Process payment"""
@@ -28,6 +80,10 @@ def payment_process(request):
     if order.payment_status == 'paid':
         return redirect('orders:order_success', order_id=order.order_id)
     
+    if order.status == 'cancelled':
+        messages.error(request, 'This order was cancelled because payment was not completed in time.')
+        return redirect('orders:order_detail', order_id=order.order_id)
+    
     # Create Razorpay order
     amount = int(order.total * 100)  # Amount in paise
     
@@ -90,6 +146,8 @@ def payment_callback(request):
             
             # Get order
             order = Order.objects.get(razorpay_order_id=razorpay_order_id)
+            # Confirming its stock runs one UPDATE per product
+            extend_budget(request, order.item_count)
             
             # Update payment record
             payment = Payment.objects.filter(
@@ -98,11 +156,8 @@ def payment_callback(request):
             ).first()
             
             if signature_verified:
-                order.payment_status = 'paid'
-                order.status = 'confirmed'
-                order.razorpay_payment_id = razorpay_payment_id
-                order.razorpay_signature = razorpay_signature
-                order.save()
+                # The webhook may have settled it already
+                order, _ = settle_payment(order, razorpay_payment_id, razorpay_signature)
                 
                 if payment:
                     payment.status = 'completed'
@@ -111,22 +166,15 @@ def payment_callback(request):
                     payment.transaction_id = razorpay_payment_id
                     payment.save()
                 
-                OrderTracking.objects.create(
-                    order=order,
-                    status='Payment Received',
-                    description=f'Payment of ₹{order.total} received via Razorpay.'
-                )
-                
-                OrderTracking.objects.create(
-                    order=order,
-                    status='Order Confirmed',
-                    description='Your order has been confirmed and is being processed.'
-                )
-                
                 # Clear order from session
                 if 'order_id' in request.session:
                     del request.session['order_id']
                 
+                # Without its stock the order stays cancelled and the payment is refunded
+                if order.status == 'cancelled':
+                    messages.error(request, 'Sorry, your items sold out before the payment completed. It will be refunded.')
+                    return redirect('orders:order_detail', order_id=order.order_id)
+                
                 return redirect('orders:order_success', order_id=order.order_id)
             else:
                 order.payment_status = 'failed'
@@ -192,10 +240,8 @@ def razorpay_webhook(request):
                 
                 try:
                     order = Order.objects.get(razorpay_order_id=razorpay_order_id)
-                    order.payment_status = 'paid'
-                    order.status = 'confirmed'
-                    order.razorpay_payment_id = razorpay_payment_id
-                    order.save()
+                    extend_budget(request, order.item_count)
+                    settle_payment(order, razorpay_payment_id)
                 except Order.DoesNotExist:
                     pass
             
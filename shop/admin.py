@@ -25,6 +25,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['price', 'discount_price', 'is_available', 'is_featured', 'is_bestseller']
+    readonly_fields = ['reserved_stock']
     raw_id_fields = ['category']
     filter_horizontal = ['flower_types']
     
@@ -42,7 +43,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('image', 'image_2', 'image_3', 'image_4')
         }),
         ('Inventory', {
-            'fields': ('stock', 'is_available')
+            'fields': ('stock', 'reserved_stock', 'is_available')
         }),
         ('Flags', {
             'fields': ('is_featured', 'is_bestseller', 'is_new')
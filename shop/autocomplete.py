@@ -0,0 +1,247 @@
+"""
+Search-as-you-type suggestions from a per-worker prefix index.
+
+Every suggestion (product, category, flower type or occasion) is indexed
+under each word-start suffix of its label, so "red rose bouquet" is found by
+"red", "rose" and "bouq". Terms are kept in one sorted list and a prefix
+lookup is two bisects; ranked results are memoized per prefix until a write
+touches it. Products follow the catalog snapshot, which reports each changed
+record; the few taxonomy entries are reloaded when the catalog version moves.
+"""
+
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Sum
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .cache import get_catalog_version
+from .catalog import catalog
+from .models import Category, FlowerType, ProductFacetCount
+from .search import tokenize
+
+
+SEPARATOR = '\x00'
+END = '\uffff'
+MAX_CACHED_PREFIXES = 5000
+
+# Above this many changed records a full rebuild is cheaper than insorting
+REBUILD_THRESHOLD = 1000
+
+
+class Suggestion:
+    __slots__ = ('key', 'kind', 'label', 'popularity', 'terms', '_url')
+
+    def __init__(self, key, kind, label, url, popularity):
+        self.key = key
+        self.kind = kind
+        self.label = label
+        self.popularity = popularity
+        self._url = url
+        words = tokenize(label)
+        self.terms = sorted({' '.join(words[i:]) for i in range(len(words))})
+
+    @property
+    def url(self):
+        return self._url
+
+    def as_dict(self):
+        return {'type': self.kind, 'label': self.label, 'url': self.url}
+
+
+class ProductSuggestion(Suggestion):
+    __slots__ = ('slug',)
+
+    def __init__(self, record):
+        # Reviews stand in for popularity; rating breaks ties
+        super().__init__(
+            f'product:{record.id}',
+            'product',
+            record.name,
+            None,
+            record.num_reviews + float(record.rating) / 10,
+        )
+        self.slug = record.slug
+
+    @property
+    def url(self):
+        # Resolved on first display; reversing every product up front dominates a rebuild
+        if self._url is None:
+            self._url = reverse('shop:product_detail', args=[self.slug])
+        return self._url
+
+
+class AutocompleteIndex:
+    """Sorted "term NUL key" strings with a parallel list of their Suggestions"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.terms = []
+        self.entries = []
+        self.suggestions = {}
+        self.results = {}
+        self.built = False
+        self.taxonomy_version = None
+        self.taxonomy_checked = 0
+        catalog.subscribe(self.apply_catalog_changes)
+
+    def suggest(self, query, limit=None):
+        """Return up to limit Suggestions whose label has a word starting with query"""
+        limit = limit or getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 8)
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+        self.refresh()
+
+        cache_key = (prefix, limit)
+        results = self.results.get(cache_key)
+        if results is None:
+            results = self._rank(prefix, limit)
+            if len(self.results) >= MAX_CACHED_PREFIXES:
+                self.results.clear()
+            self.results[cache_key] = results
+        return results
+
+    def _rank(self, prefix, limit):
+        with self.lock:
+            start = bisect.bisect_left(self.terms, prefix)
+            end = bisect.bisect_left(self.terms, prefix + END, start)
+            matches = set(self.entries[start:end])
+        return heapq.nsmallest(
+            limit, matches, key=lambda suggestion: (-suggestion.popularity, suggestion.label)
+        )
+
+    # ------------------------------------------------------------------
+    # Keeping the index current
+    # ------------------------------------------------------------------
+
+    def refresh(self):
+        catalog.refresh()
+        if not self.built:
+            with self.lock:
+                if not self.built:
+                    self.rebuild()
+            return
+
+        now = time.monotonic()
+        max_age = getattr(settings, 'AUTOCOMPLETE_TAXONOMY_MAX_AGE', 30)
+        if now - self.taxonomy_checked < max_age:
+            return
+        self.taxonomy_checked = now
+        version = get_catalog_version()
+        if version != self.taxonomy_version:
+            with self.lock:
+                self._replace(
+                    [key for key, suggestion in self.suggestions.items() if suggestion.kind != 'product'],
+                    self._taxonomy(),
+                )
+                self.taxonomy_version = version
+
+    def rebuild(self):
+        """Index every available product in the catalog snapshot plus the taxonomy"""
+        self.taxonomy_version = get_catalog_version()
+        self.taxonomy_checked = time.monotonic()
+        suggestions = {
+            suggestion.key: suggestion
+            for suggestion in self._taxonomy() + [
+                ProductSuggestion(record) for record in list(catalog.by_id.values()) if record.is_available
+            ]
+        }
+        pairs = sorted(
+            (f'{term}{SEPARATOR}{key}', suggestion)
+            for key, suggestion in suggestions.items()
+            for term in suggestion.terms
+        )
+        with self.lock:
+            self.terms = [entry for entry, suggestion in pairs]
+            self.entries = [suggestion for entry, suggestion in pairs]
+            self.suggestions, self.results = suggestions, {}
+            self.built = True
+
+    def apply_catalog_changes(self, changed, removed):
+        if not self.built:
+            return
+        with self.lock:
+            if len(changed) > REBUILD_THRESHOLD:
+                self.rebuild()
+                return
+            self._replace(
+                [f'product:{record.id}' for record in changed] +
+                [f'product:{product_id}' for product_id in removed],
+                [ProductSuggestion(record) for record in changed if record.is_available],
+            )
+
+    def _replace(self, old_keys, new_suggestions):
+        """Remove old_keys and add new_suggestions, forgetting affected cached results"""
+        touched = set()
+        for key in old_keys:
+            suggestion = self.suggestions.pop(key, None)
+            if suggestion is None:
+                continue
+            for term in suggestion.terms:
+                entry = f'{term}{SEPARATOR}{key}'
+                index = bisect.bisect_left(self.terms, entry)
+                if index < len(self.terms) and self.terms[index] == entry:
+                    del self.terms[index]
+                    del self.entries[index]
+            touched.update(suggestion.terms)
+
+        for suggestion in new_suggestions:
+            self.suggestions[suggestion.key] = suggestion
+            for term in suggestion.terms:
+                entry = f'{term}{SEPARATOR}{suggestion.key}'
+                index = bisect.bisect_left(self.terms, entry)
+                self.terms.insert(index, entry)
+                self.entries.insert(index, suggestion)
+            touched.update(suggestion.terms)
+
+        if touched:
+            prefixes = {term[:length] for term in touched for length in range(1, len(term) + 1)}
+            self.results = {
+                cache_key: results for cache_key, results in self.results.items()
+                if cache_key[0] not in prefixes
+            }
+
+    def _taxonomy(self):
+        """Suggestions for active categories, their occasions and flower types"""
+        category_counts, flower_type_counts = {}, {}
+        rows = ProductFacetCount.objects.values('category_id', 'flower_type_id').annotate(
+            total=Sum('count')
+        ).order_by()
+        for row in rows:
+            if row['flower_type_id']:
+                flower_type_counts[row['flower_type_id']] = (
+                    flower_type_counts.get(row['flower_type_id'], 0) + row['total']
+                )
+            else:
+                category_counts[row['category_id']] = row['total']
+
+        suggestions = []
+        occasion_counts = {}
+        for category in Category.objects.filter(is_active=True).only('id', 'name', 'slug', 'occasion'):
+            count = category_counts.get(category.id, 0)
+            occasion_counts[category.occasion] = occasion_counts.get(category.occasion, 0) + count
+            suggestions.append(Suggestion(
+                f'category:{category.id}', 'category', category.name,
+                reverse('shop:product_list_by_category', args=[category.slug]), count,
+            ))
+        for occasion, label in Category.OCCASION_CHOICES:
+            if occasion in occasion_counts:
+                suggestions.append(Suggestion(
+                    f'occasion:{occasion}', 'occasion', label,
+                    reverse('shop:products_by_occasion', args=[occasion]), occasion_counts[occasion],
+                ))
+        for flower_type in FlowerType.objects.only('id', 'name'):
+            suggestions.append(Suggestion(
+                f'flower_type:{flower_type.id}', 'flower_type', flower_type.name,
+                reverse('shop:search') + '?' + urlencode({'q': flower_type.name}),
+                flower_type_counts.get(flower_type.id, 0),
+            ))
+        return suggestions
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,88 @@
+"""
+Catalog version counter and versioned fragment cache.
+
+The catalog version is bumped by shop.signals whenever a product, category,
+flower type or banner changes. Cached fragments are keyed by the version, so
+an edit makes every old fragment unreachable at once without having to track
+which fragments it affected. Orders taking or returning stock bump the
+separate stock version instead, so checkouts leave cached fragments alone and
+only the pages and carts that show stock revalidate. get_version and
+bump_version keep any such counter in the cache; the per-user and coupon
+versions use them too.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.safestring import mark_safe
+
+
+CATALOG_VERSION_KEY = 'shop:catalog-version'
+STOCK_VERSION_KEY = 'shop:stock-version'
+
+# Per-user versions expire; a lost one restarts from the clock like the catalog version
+USER_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+# Rendered into cached fragments in place of the per-visitor CSRF token
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+
+
+def get_version(key, timeout=None):
+    """Current value of the cache-backed counter at key"""
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a lost counter never reuses an old version
+        cache.add(key, int(time.time() * 1000), timeout)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key, timeout=None):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key, timeout)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def get_stock_version():
+    return get_version(STOCK_VERSION_KEY)
+
+
+def bump_stock_version():
+    return bump_version(STOCK_VERSION_KEY)
+
+
+def get_user_version(user_id):
+    """Counter for per-user page state (wishlist, name) shown on catalog pages"""
+    return get_version(f'shop:user-version:{user_id}', USER_VERSION_TIMEOUT)
+
+
+def bump_user_version(user_id):
+    return bump_version(f'shop:user-version:{user_id}', USER_VERSION_TIMEOUT)
+
+
+def get_fragment(name, render):
+    """Return fragment HTML for the current catalog version, rendering on a miss"""
+    key = f'shop:fragment:{name}:{get_catalog_version()}'
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300))
+    return html
+
+
+def fill_csrf_token(request, html):
+    """Swap the CSRF placeholder in a cached fragment for this visitor's token"""
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return mark_safe(html)
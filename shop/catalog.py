@@ -0,0 +1,204 @@
+"""
+In-process catalog snapshot for hot read endpoints.
+
+Each worker keeps a compact ProductRecord per product, indexed by id and
+slug, so quick view, cart and wishlist requests can resolve products without
+a database round trip. The snapshot is loaded once, then refreshed from
+Product.updated_at deltas at most every CATALOG_SNAPSHOT_MAX_AGE seconds, and
+fully reloaded every CATALOG_SNAPSHOT_FULL_RELOAD seconds to drop products
+deleted by other workers. Saves in this worker are applied immediately by
+shop.signals. Derived per-worker indexes subscribe() to hear about every
+record that changes, whichever of these paths it arrives by.
+"""
+
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import Http404
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Product
+
+
+# Re-read recent rows on each refresh so slow transactions are not missed
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+SIZE_LABELS = dict(Product.SIZE_CHOICES)
+
+
+class ProductRecord:
+    """Read-only subset of a Product, small enough to keep for the whole catalog"""
+    __slots__ = (
+        'id', 'slug', 'name', 'category_id', 'price', 'discount_price',
+        'discount_percentage', 'image', 'short_description', 'size', 'stock',
+        'is_available', 'same_day_delivery', 'rating', 'num_reviews', 'updated_at',
+    )
+    FIELDS = __slots__
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_instance(cls, product):
+        values = [getattr(product, name) for name in cls.FIELDS]
+        values[cls.FIELDS.index('image')] = product.image.name or ''
+        return cls(*values)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def final_price(self):
+        if self.discount_price:
+            return self.discount_price
+        return self.price
+
+    @property
+    def is_on_sale(self):
+        return self.discount_price is not None and self.discount_price < self.price
+
+    @property
+    def in_stock(self):
+        return self.stock > 0 and self.is_available
+
+    @property
+    def image_url(self):
+        if not self.image:
+            return ''
+        return Product._meta.get_field('image').storage.url(self.image)
+
+    def get_size_display(self):
+        return SIZE_LABELS.get(self.size, self.size)
+
+    def get_absolute_url(self):
+        return reverse('shop:product_detail', args=[self.slug])
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogSnapshot:
+    """Per-worker map of product id and slug to ProductRecord"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.by_slug = {}
+        self.synced_at = None
+        self.checked_at = 0
+        self.loaded_at = 0
+        self.listeners = []
+
+    def subscribe(self, listener):
+        """Call listener(changed_records, removed_ids) after every change to the snapshot"""
+        self.listeners.append(listener)
+
+    def _notify(self, changed, removed=()):
+        if changed or removed:
+            for listener in self.listeners:
+                listener(changed, removed)
+
+    def get(self, product_id):
+        self.refresh()
+        return self.by_id.get(product_id)
+
+    def get_by_slug(self, slug):
+        self.refresh()
+        return self.by_slug.get(slug)
+
+    def get_or_404(self, product_id):
+        record = self.get(product_id)
+        if record is None:
+            raise Http404('No product matches the given query.')
+        return record
+
+    def get_by_slug_or_404(self, slug):
+        record = self.get_by_slug(slug)
+        if record is None:
+            raise Http404('No product matches the given query.')
+        return record
+
+    def refresh(self, force=False):
+        """Apply changes made by other workers once the snapshot is older than the staleness bound"""
+        now = time.monotonic()
+        max_age = getattr(settings, 'CATALOG_SNAPSHOT_MAX_AGE', 5)
+        full_reload = getattr(settings, 'CATALOG_SNAPSHOT_FULL_RELOAD', 300)
+        if not force and self.synced_at is not None and now - self.checked_at < max_age:
+            return
+        # Only one thread refreshes; the others keep serving the current snapshot
+        if not self.lock.acquire(blocking=self.synced_at is None):
+            return
+        try:
+            if self.synced_at is None or now - self.loaded_at >= full_reload:
+                self._load()
+                self.loaded_at = now
+            else:
+                self._load(since=self.synced_at - REFRESH_OVERLAP)
+            self.checked_at = now
+        finally:
+            self.lock.release()
+
+    def _load(self, since=None):
+        rows = Product.objects.values_list(*ProductRecord.FIELDS).order_by()
+        if since is not None:
+            rows = rows.filter(updated_at__gte=since)
+            by_id, by_slug = self.by_id, self.by_slug
+        else:
+            by_id, by_slug = {}, {}
+
+        previous = self.by_id
+        changed = []
+        synced_at = self.synced_at if since is not None else None
+        for values in rows.iterator(chunk_size=2000):
+            record = ProductRecord(*values)
+            old = previous.get(record.id)
+            if old is None or old.updated_at != record.updated_at:
+                changed.append(record)
+            self._store(record, by_id, by_slug)
+            if synced_at is None or record.updated_at > synced_at:
+                synced_at = record.updated_at
+
+        removed = []
+        if since is None:
+            removed = [product_id for product_id in previous if product_id not in by_id]
+            self.by_id, self.by_slug = by_id, by_slug
+        self.synced_at = synced_at or self.synced_at or timezone.now()
+        self._notify(changed, removed)
+
+    def _store(self, record, by_id, by_slug):
+        previous = by_id.get(record.id)
+        if previous is not None and previous.slug != record.slug:
+            by_slug.pop(previous.slug, None)
+        by_id[record.id] = record
+        by_slug[record.slug] = record
+
+    def update(self, product):
+        """Apply a product saved in this worker"""
+        if self.synced_at is not None:
+            record = ProductRecord.from_instance(product)
+            self._store(record, self.by_id, self.by_slug)
+            self._notify([record])
+
+    def reload(self, product_ids):
+        """Re-read products changed in this worker by queryset.update(), which sends no signals"""
+        if self.synced_at is None:
+            return
+        rows = Product.objects.filter(pk__in=product_ids).values_list(*ProductRecord.FIELDS)
+        records = [ProductRecord(*values) for values in rows]
+        for record in records:
+            self._store(record, self.by_id, self.by_slug)
+        self._notify(records)
+
+    def remove(self, product_id):
+        record = self.by_id.pop(product_id, None)
+        if record is not None:
+            self.by_slug.pop(record.slug, None)
+            self._notify([], [product_id])
+
+
+catalog = CatalogSnapshot()
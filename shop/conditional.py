@@ -0,0 +1,70 @@
+"""
+Validators for conditional GETs on catalog pages.
+
+Catalog pages depend on the catalog (covered by the catalog version), on who
+is logged in and their wishlist (the per-user version), on the cart count in
+the header and on the CSRF token embedded in forms. The page ETag digests all
+of these without touching the database beyond the session lookup, so a
+matching If-None-Match is answered with a 304 before the view runs. Product
+pages also show stock, so their ETag adds the stock version that orders bump.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages import get_messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from cart.cart import cart_fingerprint
+from .cache import get_catalog_version, get_stock_version, get_user_version
+from .catalog import catalog
+
+
+def page_etag(request, *args, **kwargs):
+    # Flash messages render once, so never let a revalidation hide or repeat them
+    if len(get_messages(request)):
+        return None
+    user_id = request.session.get(SESSION_KEY)
+    parts = [
+        get_catalog_version(),
+        user_id or '',
+        get_user_version(user_id) if user_id else '',
+        cart_fingerprint(request),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    return hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+
+
+def product_page_etag(request, *args, **kwargs):
+    etag = page_etag(request, *args, **kwargs)
+    return etag and f'{etag}-{get_stock_version()}'
+
+
+def quick_view_etag(request, product_id):
+    record = catalog.get(product_id)
+    if record is None:
+        return None
+    return f'{record.id}-{int(record.updated_at.timestamp() * 1000000)}'
+
+
+def quick_view_last_modified(request, product_id):
+    record = catalog.get(product_id)
+    return record.updated_at if record else None
+
+
+def catalog_page(view):
+    """Answer revalidations of a catalog page with 304 when nothing it shows has changed"""
+    return cache_control(no_cache=True)(condition(etag_func=page_etag)(view))
+
+
+def product_page(view):
+    """catalog_page for pages that also show stock"""
+    return cache_control(no_cache=True)(condition(etag_func=product_page_etag)(view))
+
+
+def quick_view_page(view):
+    return cache_control(no_cache=True)(
+        condition(etag_func=quick_view_etag, last_modified_func=quick_view_last_modified)(view)
+    )
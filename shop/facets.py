@@ -0,0 +1,257 @@
+"""
+Precomputed facet counts for the product listing sidebar.
+
+Each available product adds one to the ProductFacetCount row for its
+(category, size, same day delivery, price bucket) combination, plus one row
+per flower type it contains. The whole table is tiny - it grows with the
+number of distinct combinations, not with the catalog - so every facet for
+any filter combination is answered from a single query.
+"""
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Product, ProductFacetCount
+
+
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('2000')),
+    (Decimal('2000'), Decimal('5000')),
+    (Decimal('5000'), None),
+]
+
+ALL_FLOWER_TYPES = 0
+
+
+def price_bucket(price):
+    """Index of the PRICE_BUCKETS range containing price"""
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        if high is None or price < high:
+            return index
+    return len(PRICE_BUCKETS) - 1
+
+
+def price_bucket_label(index):
+    low, high = PRICE_BUCKETS[index]
+    if high is None:
+        return f'₹{low:,.0f}+'
+    return f'₹{low:,.0f} - ₹{high:,.0f}'
+
+
+def parse_price_bucket(value):
+    """Return bucket index for a ?price= value, or None"""
+    try:
+        index = int(value)
+    except (TypeError, ValueError):
+        return None
+    return index if 0 <= index < len(PRICE_BUCKETS) else None
+
+
+def filter_price_bucket(queryset, index):
+    low, high = PRICE_BUCKETS[index]
+    queryset = queryset.filter(price__gte=low)
+    if high is not None:
+        queryset = queryset.filter(price__lt=high)
+    return queryset
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def snapshot(product_ids):
+    """Facet keys contributed by each product, as {product_id: [key, ...]}"""
+    flower_types = defaultdict(list)
+    through = Product.flower_types.through
+    for product_id, flower_type_id in through.objects.filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'flowertype_id'):
+        flower_types[product_id].append(flower_type_id)
+
+    keys = {}
+    products = Product.objects.filter(pk__in=product_ids, is_available=True).values_list(
+        'pk', 'category_id', 'size', 'same_day_delivery', 'price'
+    )
+    for product_id, category_id, size, same_day, price in products:
+        base = (category_id, size, same_day, price_bucket(price))
+        keys[product_id] = [base + (ALL_FLOWER_TYPES,)] + [
+            base + (flower_type_id,) for flower_type_id in flower_types[product_id]
+        ]
+    return keys
+
+
+def apply_change(before, after):
+    """Apply the difference between two snapshots to the stored counts"""
+    deltas = Counter()
+    for keys in before.values():
+        deltas.subtract(keys)
+    for keys in after.values():
+        deltas.update(keys)
+    for key, delta in deltas.items():
+        if delta:
+            _add(key, delta)
+
+
+def _add(key, delta):
+    category_id, size, same_day, bucket, flower_type_id = key
+    rows = ProductFacetCount.objects.filter(
+        category_id=category_id,
+        size=size,
+        same_day_delivery=same_day,
+        price_bucket=bucket,
+        flower_type_id=flower_type_id,
+    )
+    if rows.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            rows.create(
+                category_id=category_id,
+                size=size,
+                same_day_delivery=same_day,
+                price_bucket=bucket,
+                flower_type_id=flower_type_id,
+                count=delta,
+            )
+    except IntegrityError:
+        # Another request created the row first
+        rows.update(count=F('count') + delta)
+
+
+def rebuild():
+    """Recompute every count from scratch"""
+    counts = Counter()
+    product_ids = Product.objects.filter(is_available=True).values_list('pk', flat=True)
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 2000):
+        for keys in snapshot(product_ids[start:start + 2000]).values():
+            counts.update(keys)
+
+    with transaction.atomic():
+        ProductFacetCount.objects.all().delete()
+        ProductFacetCount.objects.bulk_create([
+            ProductFacetCount(
+                category_id=category_id,
+                size=size,
+                same_day_delivery=same_day,
+                price_bucket=bucket,
+                flower_type_id=flower_type_id,
+                count=count,
+            )
+            for (category_id, size, same_day, bucket, flower_type_id), count in counts.items()
+        ], batch_size=1000)
+    return len(counts)
+
+
+# ---------------------------------------------------------------------------
+# Reading counts
+# ---------------------------------------------------------------------------
+
+FACETS = ['category', 'occasion', 'size', 'same_day', 'price', 'flower_type']
+
+
+def empty_counts():
+    counts = {facet: Counter() for facet in FACETS}
+    counts['total'] = 0
+    return counts
+
+
+def get_facet_counts(category=None, occasion=None, size=None, same_day=False, price=None):
+    """
+    Counts for every facet under the given filters.
+
+    Each facet is counted with all *other* filters applied, so the sidebar
+    shows how many products selecting that option would return.
+    """
+    filters = {
+        'category': category,
+        'occasion': occasion or None,
+        'size': size or None,
+        'same_day': True if same_day else None,
+        'price': price,
+    }
+    counts = empty_counts()
+    rows = ProductFacetCount.objects.filter(count__gt=0).values_list(
+        'category_id', 'category__occasion', 'size', 'same_day_delivery',
+        'price_bucket', 'flower_type_id', 'count'
+    )
+    for category_id, row_occasion, row_size, row_same_day, bucket, flower_type_id, count in rows:
+        values = {
+            'category': category_id,
+            'occasion': row_occasion,
+            'size': row_size,
+            'same_day': row_same_day,
+            'price': bucket,
+        }
+        failed = [facet for facet, wanted in filters.items()
+                  if wanted is not None and values[facet] != wanted]
+        if len(failed) > 1:
+            continue
+
+        if flower_type_id != ALL_FLOWER_TYPES:
+            if not failed:
+                counts['flower_type'][flower_type_id] += count
+            continue
+
+        if failed:
+            # Only the facet whose own filter failed gets this row
+            counts[failed[0]][values[failed[0]]] += count
+        else:
+            counts['total'] += count
+            for facet, value in values.items():
+                counts[facet][value] += count
+    return counts
+
+
+def naive_facet_counts(category=None, occasion=None, size=None, same_day=False, price=None,
+                       min_price=None, max_price=None):
+    """
+    Same result as get_facet_counts using one GROUP BY per facet.
+
+    Also handles free-form min_price/max_price ranges, which do not line up
+    with the precomputed price buckets.
+    """
+    def filter_price(qs):
+        if price is not None:
+            qs = filter_price_bucket(qs, price)
+        if min_price:
+            qs = qs.filter(price__gte=min_price)
+        if max_price:
+            qs = qs.filter(price__lte=max_price)
+        return qs
+
+    filters = {
+        'category': lambda qs: qs.filter(category_id=category) if category else qs,
+        'occasion': lambda qs: qs.filter(category__occasion=occasion) if occasion else qs,
+        'size': lambda qs: qs.filter(size=size) if size else qs,
+        'same_day': lambda qs: qs.filter(same_day_delivery=True) if same_day else qs,
+        'price': filter_price,
+    }
+
+    def filtered(exclude=None):
+        queryset = Product.objects.filter(is_available=True)
+        for facet, apply in filters.items():
+            if facet != exclude:
+                queryset = apply(queryset)
+        return queryset
+
+    counts = empty_counts()
+    counts['total'] = filtered().count()
+    for facet, field in [('category', 'category_id'), ('occasion', 'category__occasion'),
+                         ('size', 'size'), ('same_day', 'same_day_delivery')]:
+        for row in filtered(facet).values(field).annotate(n=Count('pk')).order_by():
+            counts[facet][row[field]] = row['n']
+    for index in range(len(PRICE_BUCKETS)):
+        n = filter_price_bucket(filtered('price'), index).count()
+        if n:
+            counts['price'][index] = n
+    for row in filtered().filter(flower_types__isnull=False).values('flower_types').annotate(
+        n=Count('pk')
+    ).order_by():
+        counts['flower_type'][row['flower_types']] = row['n']
+    return counts
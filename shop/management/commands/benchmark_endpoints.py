@@ -0,0 +1,231 @@
+import json
+import platform
+import random
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from flower_shop.query_budget import record_queries
+from orders.delivery import resolve_slot
+from orders.models import Address, DeliverySlot, Order, OrderItem, OrderTracking
+from shop.models import Product
+
+
+SEARCH_TERMS = ['rose', 'red roses', 'lily', 'orchid basket', 'sunflower', 'pink bouquet', 'tulips']
+LIST_SORTS = ['', '?sort=price_low', '?sort=price_high', '?sort=rating', '?page=2']
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, query counts and memory of the main shop endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--memory-iterations', type=int, default=5,
+                            help='Requests per endpoint traced for peak memory (slow); 0 to skip')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only run these endpoints (repeatable)')
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--seed', type=int, default=42)
+
+    # A view over its query budget fails the run instead of only being logged
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.product_ids = list(
+            Product.objects.filter(is_available=True, stock__gt=100).values_list('id', flat=True)[:5000]
+        )
+        if not self.product_ids:
+            raise CommandError('No products in stock - run seed_benchmark_data first')
+        self.slugs = dict(Product.objects.filter(id__in=self.product_ids).values_list('id', 'slug'))
+
+        self.customer = self.get_customer()
+        self.address = Address.objects.filter(user=self.customer).first()
+        # Every benchmarked checkout books the same delivery slot; don't let it fill up
+        slot_id = resolve_slot(timezone.localdate() + timedelta(days=1), '12:00-15:00', self.address.city)
+        DeliverySlot.objects.filter(pk=slot_id).update(capacity=F('booked') + 1_000_000)
+        self.customer_client = Client()
+        self.customer_client.force_login(self.customer)
+        self.anonymous_client = Client()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.get_staff())
+
+        endpoints = self.endpoints()
+        selected = options['endpoints'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+        self.stdout.write(
+            f'{"endpoint":<20} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+            f'{"queries":>8} {"peak KiB":>9}'
+        )
+        results = {}
+        for name in selected:
+            results[name] = self.run(name, endpoints[name], options)
+            result = results[name]
+            peak = result['peak_memory_kib']
+            self.stdout.write(
+                f'{name:<20} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} '
+                f'{result["queries_mean"]:8.1f} {peak if peak is not None else "-":>9}'
+            )
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'dataset': {
+                'products': Product.objects.count(),
+                'users': User.objects.count(),
+                'orders': Order.objects.count(),
+                'order_items': OrderItem.objects.count(),
+                'order_tracking': OrderTracking.objects.count(),
+            },
+            'endpoints': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Results written to {options["output"]}'))
+
+    def get_customer(self):
+        """A customer with an address and the most typical order history"""
+        order = Order.objects.filter(user__addresses__isnull=False).order_by('-id').first()
+        if order is None:
+            raise CommandError('No customer with an address and orders - run seed_benchmark_data first')
+        return order.user
+
+    def get_staff(self):
+        staff, created = User.objects.get_or_create(
+            username='bench-staff',
+            defaults={'is_staff': True, 'email': 'bench-staff@example.com'}
+        )
+        return staff
+
+    # ------------------------------------------------------------------
+    # Endpoints: name -> (client, prepare, request); only request is timed
+    # ------------------------------------------------------------------
+
+    def endpoints(self):
+        customer, anonymous, staff = self.customer_client, self.anonymous_client, self.staff_client
+        return {
+            'home': (anonymous, None, lambda c: c.get(reverse('shop:home'))),
+            'product_list': (anonymous, None, lambda c: c.get(
+                reverse('shop:product_list') + self.random.choice(LIST_SORTS)
+            )),
+            'product_detail': (anonymous, None, lambda c: c.get(
+                reverse('shop:product_detail', args=[self.slugs[self.random_product()]])
+            )),
+            'search': (anonymous, None, lambda c: c.get(
+                reverse('shop:search'), {'q': self.random.choice(SEARCH_TERMS)}
+            )),
+            'autocomplete': (anonymous, None, lambda c: c.get(
+                reverse('shop:autocomplete'), {'q': self.random.choice(SEARCH_TERMS)[:3]}
+            )),
+            'cart_add': (customer, None, lambda c: c.post(
+                reverse('cart:cart_add', args=[self.random_product()]), {'quantity': 1}
+            )),
+            'cart_update': (customer, self.fill_cart, lambda c: c.post(
+                reverse('cart:cart_update', args=[self.product_ids[0]]),
+                {'quantity': self.random.randint(1, 5)}
+            )),
+            'cart_batch': (customer, None, lambda c: c.post(
+                reverse('cart:cart_batch'),
+                json.dumps([
+                    {'product_id': product_id, 'quantity': 1, 'mode': 'set'}
+                    for product_id in self.random.sample(self.product_ids, min(10, len(self.product_ids)))
+                ]),
+                content_type='application/json'
+            )),
+            'checkout': (customer, self.fill_cart, lambda c: c.get(reverse('orders:checkout'))),
+            'checkout_submit': (customer, self.fill_cart, self.submit_checkout),
+            'order_list': (customer, None, lambda c: c.get(reverse('orders:order_list'))),
+            'order_management': (staff, None, lambda c: c.get(reverse('shop:order_management'))),
+        }
+
+    def random_product(self):
+        return self.random.choice(self.product_ids)
+
+    def fill_cart(self, client):
+        for product_id in [self.product_ids[0], self.random_product(), self.random_product()]:
+            client.post(reverse('cart:cart_add', args=[product_id]), {'quantity': 1})
+
+    def submit_checkout(self, client):
+        return client.post(reverse('orders:checkout'), {
+            'address': self.address.id,
+            'delivery_date': (timezone.localdate() + timedelta(days=1)).isoformat(),
+            'delivery_time_slot': '12:00-15:00',
+            'payment_method': 'cod',
+        })
+
+    # ------------------------------------------------------------------
+
+    def run(self, name, endpoint, options):
+        client, prepare, request = endpoint
+
+        def call():
+            if prepare:
+                prepare(client)
+            started = time.perf_counter()
+            with record_queries() as queries:
+                response = request(client)
+            return time.perf_counter() - started, queries.count, response.status_code
+
+        for _ in range(options['warmup']):
+            call()
+
+        timings, query_counts, statuses = [], [], Counter()
+        for _ in range(options['iterations']):
+            elapsed, queries, status = call()
+            timings.append(elapsed * 1000)
+            query_counts.append(queries)
+            statuses[status] += 1
+
+        # Memory is traced separately since tracemalloc slows every allocation
+        peak = None
+        if options['memory_iterations']:
+            tracemalloc.start()
+            try:
+                peaks = []
+                for _ in range(options['memory_iterations']):
+                    if prepare:
+                        prepare(client)
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                    request(client)
+                    peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+                peak = round(max(peaks) / 1024)
+            finally:
+                tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'samples': len(timings),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries_mean': round(sum(query_counts) / len(query_counts), 2),
+            'queries_max': max(query_counts),
+            'peak_memory_kib': peak,
+            'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        }
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from shop import facets
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Compare precomputed facet counts against per-facet GROUP BY aggregation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        
+        # A spread of filter combinations like the sidebar produces
+        combinations = [{}]
+        combinations += [{'category': pk} for pk in Category.objects.values_list('pk', flat=True)[:5]]
+        combinations += [{'occasion': 'birthday'}, {'same_day': True}]
+        combinations += [{'size': value} for value, label in Product.SIZE_CHOICES]
+        combinations += [{'price': index, 'same_day': True} for index in range(len(facets.PRICE_BUCKETS))]
+        
+        self.stdout.write(
+            f'Products: {Product.objects.count()}, '
+            f'combinations: {len(combinations)}, iterations: {iterations}\n'
+        )
+        
+        results = {}
+        for name, func in [('precomputed', facets.get_facet_counts), ('naive', facets.naive_facet_counts)]:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    output = [func(**filters) for filters in combinations]
+                elapsed = time.perf_counter() - started
+            calls = iterations * len(combinations)
+            results[name] = output
+            self.stdout.write(
+                f'  {name:<12} {elapsed / calls * 1000:8.3f} ms/call  '
+                f'{len(queries) / calls:5.1f} queries/call'
+            )
+        
+        if results['precomputed'] != results['naive']:
+            raise CommandError('Precomputed counts differ from naive aggregation - run rebuild_facet_counts')
+        self.stdout.write(self.style.SUCCESS('\n✅ Precomputed counts match naive aggregation'))
@@ -0,0 +1,111 @@
+import heapq
+import time
+from collections import Counter
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from orders.models import OrderItem
+from shop.cache import bump_catalog_version
+from shop.models import RelatedProduct
+
+
+class Command(BaseCommand):
+    help = 'Build the "frequently bought together" table from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=8,
+                            help='Related products to keep per product')
+        parser.add_argument('--max-pairs', type=int, default=5_000_000,
+                            help='Memory budget: distinct product pairs held while counting')
+        parser.add_argument('--max-basket', type=int, default=50,
+                            help='Ignore orders with more distinct products than this')
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pairs, lines, orders = self.count_pairs(options)
+        self.stdout.write(f'  Scanned {lines} order lines in {orders} orders, {len(pairs)} product pairs')
+        
+        neighbours = self.top_neighbours(pairs, options['top_k'])
+        del pairs
+        
+        rows = []
+        for product_id, heap in neighbours.items():
+            for rank, (score, negative_id) in enumerate(sorted(heap, reverse=True)):
+                rows.append(RelatedProduct(
+                    product_id=product_id, related_id=-negative_id, score=score, rank=rank
+                ))
+        with transaction.atomic():
+            RelatedProduct.objects.all().delete()
+            RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+        # Product pages show these, so cached copies must revalidate
+        bump_catalog_version()
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Stored {len(rows)} related products for {len(neighbours)} products in {elapsed:.1f}s'
+        ))
+
+    def count_pairs(self, options):
+        """
+        Count how many orders contain each product pair.
+
+        Order lines are streamed in order_id order, so only one basket is held
+        at a time. Pairs are packed into single integer keys (low id in the
+        high bits) to keep the counter compact; when it grows past max_pairs
+        only the strongest half is kept, so memory stays bounded at the cost of
+        undercounting pairs that first appear late.
+        """
+        max_pairs = options['max_pairs']
+        max_basket = options['max_basket']
+        pairs = Counter()
+        lines = orders = 0
+
+        def add_basket(basket):
+            if len(basket) < 2 or len(basket) > max_basket:
+                return
+            items = sorted(basket)
+            for i, low in enumerate(items):
+                for high in items[i + 1:]:
+                    pairs[(low << 32) | high] += 1
+            if len(pairs) > max_pairs:
+                strongest = heapq.nlargest(max_pairs // 2, pairs.items(), key=itemgetter(1))
+                pairs.clear()
+                pairs.update(dict(strongest))
+
+        rows = OrderItem.objects.filter(product__isnull=False).exclude(
+            order__status__in=['cancelled', 'refunded']
+        ).order_by('order_id').values_list(
+            'order_id', 'product_id'
+        )
+        current_order, basket = None, set()
+        for order_id, product_id in rows.iterator(chunk_size=options['chunk_size']):
+            lines += 1
+            if order_id != current_order:
+                add_basket(basket)
+                orders += 1
+                current_order, basket = order_id, set()
+            basket.add(product_id)
+        add_basket(basket)
+        return pairs, lines, orders
+
+    def top_neighbours(self, pairs, top_k):
+        """Keep the top_k strongest pairs per product as (score, -related_id) min-heaps"""
+        neighbours = {}
+        mask = (1 << 32) - 1
+
+        def push(product_id, related_id, score):
+            heap = neighbours.setdefault(product_id, [])
+            # Negative id breaks score ties in favour of the lower product id
+            entry = (score, -related_id)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+        for key, score in pairs.items():
+            low, high = key >> 32, key & mask
+            push(low, high, score)
+            push(high, low, score)
+        return neighbours
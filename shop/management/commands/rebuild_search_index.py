@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from shop.models import Product
+from shop.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        
+        indexed = 0
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            indexed += index_products(Product.objects.filter(pk__in=batch))
+            self.stdout.write(f'  Indexed {indexed}/{len(product_ids)} products')
+        
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Search index rebuilt for {indexed} products'))
@@ -0,0 +1,246 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from orders.models import Address, Order, OrderItem, OrderTracking
+from shop.cache import bump_catalog_version
+from shop.models import Category, FlowerType, Product
+
+
+PRODUCT_PREFIX = 'bench-product-'
+USER_PREFIX = 'bench-user-'
+ORDER_PREFIX = 'BENCH'
+BENCH_PASSWORD = 'bench-password'
+
+COLORS = ['Red', 'White', 'Pink', 'Yellow', 'Purple', 'Orange', 'Blue', 'Peach', 'Mixed']
+FLOWERS = ['Roses', 'Lilies', 'Tulips', 'Carnations', 'Orchids', 'Sunflowers', 'Gerberas', 'Daisies']
+STYLES = ['Bouquet', 'Basket', 'Bunch', 'Vase Arrangement', 'Box', 'Hand-tied', 'Heart Arrangement']
+CITIES = [
+    ('Mumbai', 'Maharashtra', '400001'), ('Delhi', 'Delhi', '110001'),
+    ('Bengaluru', 'Karnataka', '560001'), ('Chennai', 'Tamil Nadu', '600001'),
+    ('Kolkata', 'West Bengal', '700001'), ('Pune', 'Maharashtra', '411001'),
+]
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'out_for_delivery', 'delivered', 'cancelled']
+TRACKING_STEPS = {
+    'pending': ['Order Placed'],
+    'confirmed': ['Order Placed', 'Order Confirmed'],
+    'processing': ['Order Placed', 'Order Confirmed', 'Processing'],
+    'out_for_delivery': ['Order Placed', 'Order Confirmed', 'Processing', 'Out for Delivery'],
+    'delivered': ['Order Placed', 'Order Confirmed', 'Processing', 'Out for Delivery', 'Delivered'],
+    'cancelled': ['Order Placed', 'Cancelled'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Seed a large synthetic dataset for the benchmark_endpoints command'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--max-items', type=int, default=4, help='Maximum lines per order')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously seeded benchmark data first')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if options['clear']:
+            self.clear()
+
+        categories, flower_types = self.taxonomy()
+        products = self.seed_products(options['products'], categories, flower_types)
+        users = self.seed_users(options['users'])
+        if users and products:
+            self.seed_orders(options['orders'], users, products, options['max_items'])
+
+        # bulk_create skips the signals that keep derived tables current
+        self.stdout.write('Rebuilding derived tables...')
+        call_command('rebuild_search_index', stdout=self.stdout)
+        call_command('rebuild_facet_counts', stdout=self.stdout)
+        bump_catalog_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'\n✅ Benchmark data seeded in {elapsed:.0f}s'))
+
+    def clear(self):
+        self.stdout.write('Clearing previous benchmark data...')
+        Order.objects.filter(order_id__startswith=ORDER_PREFIX).delete()
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+        Product.objects.filter(slug__startswith=PRODUCT_PREFIX).delete()
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(start + self.batch_size, total)
+
+    def progress(self, label, done, total):
+        self.stdout.write(f'  {label}: {done}/{total}')
+
+    def taxonomy(self):
+        categories = list(Category.objects.filter(is_active=True))
+        if not categories:
+            categories = [
+                Category.objects.create(name=label, slug=f'bench-{value}', occasion=value)
+                for value, label in Category.OCCASION_CHOICES
+            ]
+        flower_types = list(FlowerType.objects.all())
+        if not flower_types:
+            flower_types = [
+                FlowerType.objects.create(name=name, slug=f'bench-{name.lower()}') for name in FLOWERS
+            ]
+        return categories, flower_types
+
+    def seed_products(self, total, categories, flower_types):
+        """Create products; returns [(id, name, price)] for the order generator"""
+        rng = self.random
+        offset = Product.objects.filter(slug__startswith=PRODUCT_PREFIX).count()
+        sizes = [value for value, label in Product.SIZE_CHOICES]
+        through = Product.flower_types.through
+        products = []
+
+        for start, end in self.batches(total):
+            batch = []
+            for n in range(offset + start, offset + end):
+                color, flower, style = rng.choice(COLORS), rng.choice(FLOWERS), rng.choice(STYLES)
+                name = f'{color} {flower} {style} {n}'
+                price = Decimal(rng.randrange(299, 9999))
+                discount_price = None
+                discount_percentage = 0
+                if rng.random() < 0.3:
+                    discount_percentage = rng.choice([10, 15, 20, 25])
+                    discount_price = (price * (100 - discount_percentage) / 100).quantize(Decimal('1'))
+                batch.append(Product(
+                    category=rng.choice(categories),
+                    name=name,
+                    slug=f'{PRODUCT_PREFIX}{n}',
+                    description=f'A {style.lower()} of fresh {color.lower()} {flower.lower()}, '
+                                f'hand-arranged and delivered fresh.',
+                    short_description=f'Fresh {color.lower()} {flower.lower()}',
+                    price=price,
+                    discount_price=discount_price,
+                    discount_percentage=discount_percentage,
+                    size=rng.choice(sizes),
+                    contains=f'{rng.randint(6, 50)} {flower.lower()}, greenery, wrapping',
+                    image='products/placeholder.jpg',
+                    stock=rng.randint(0, 500),
+                    is_available=rng.random() < 0.95,
+                    is_featured=rng.random() < 0.01,
+                    is_bestseller=rng.random() < 0.01,
+                    is_new=rng.random() < 0.02,
+                    same_day_delivery=rng.random() < 0.7,
+                    rating=Decimal(rng.randint(30, 50)) / 10,
+                    num_reviews=rng.randint(0, 200),
+                ))
+            created = Product.objects.bulk_create(batch)
+            through.objects.bulk_create([
+                through(product_id=product.id, flowertype_id=flower_type.id)
+                for product in created
+                for flower_type in rng.sample(flower_types, min(len(flower_types), rng.randint(1, 3)))
+            ])
+            products.extend((product.id, product.name, product.final_price) for product in created)
+            self.progress('Products', end, total)
+        return products
+
+    def seed_users(self, total):
+        """Create customers with a profile and default address; returns their ids"""
+        rng = self.random
+        offset = User.objects.filter(username__startswith=USER_PREFIX).count()
+        password = make_password(BENCH_PASSWORD)
+        user_ids = []
+
+        for start, end in self.batches(total):
+            created = User.objects.bulk_create([
+                User(
+                    username=f'{USER_PREFIX}{n}',
+                    email=f'{USER_PREFIX}{n}@example.com',
+                    first_name='Bench',
+                    last_name=f'User {n}',
+                    password=password,
+                )
+                for n in range(offset + start, offset + end)
+            ])
+            UserProfile.objects.bulk_create([UserProfile(user_id=user.id) for user in created])
+            addresses = []
+            for user in created:
+                city, state, pincode = rng.choice(CITIES)
+                addresses.append(Address(
+                    user_id=user.id,
+                    full_name=f'{user.first_name} {user.last_name}',
+                    phone=f'9{rng.randrange(10 ** 8, 10 ** 9)}',
+                    address_line1=f'{rng.randint(1, 999)} Market Road',
+                    city=city,
+                    state=state,
+                    pincode=pincode,
+                    is_default=True,
+                ))
+            Address.objects.bulk_create(addresses)
+            user_ids.extend(user.id for user in created)
+            self.progress('Users', end, total)
+        return user_ids
+
+    def seed_orders(self, total, user_ids, products, max_items):
+        rng = self.random
+        offset = Order.objects.filter(order_id__startswith=ORDER_PREFIX).count()
+        now = timezone.now()
+
+        for start, end in self.batches(total):
+            orders, lines = [], []
+            for n in range(offset + start, offset + end):
+                city, state, pincode = rng.choice(CITIES)
+                items = rng.sample(products, min(len(products), rng.randint(1, max_items)))
+                quantities = [rng.randint(1, 3) for _ in items]
+                subtotal = sum(price * quantity for (_, _, price), quantity in zip(items, quantities))
+                delivery_charge = Decimal(0 if subtotal >= 500 else 50)
+                status = rng.choice(ORDER_STATUSES)
+                orders.append(Order(
+                    order_id=f'{ORDER_PREFIX}{n:09d}',
+                    user_id=rng.choice(user_ids),
+                    full_name='Bench Customer',
+                    email='bench@example.com',
+                    phone='9000000000',
+                    address_line1='1 Market Road',
+                    city=city,
+                    state=state,
+                    pincode=pincode,
+                    subtotal=subtotal,
+                    delivery_charge=delivery_charge,
+                    total=subtotal + delivery_charge,
+                    status=status,
+                    payment_status='paid' if status in ('delivered', 'out_for_delivery') else 'pending',
+                    delivery_date=(now + timedelta(days=rng.randint(-365, 7))).date(),
+                    delivery_time_slot='12:00-15:00',
+                    item_count=sum(quantities),
+                    first_item_name=items[0][1],
+                ))
+                lines.append(list(zip(items, quantities)))
+
+            created = Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order_id=order.id,
+                    product_id=product_id,
+                    product_name=name,
+                    price=price,
+                    quantity=quantity,
+                )
+                for order, order_lines in zip(created, lines)
+                for (product_id, name, price), quantity in order_lines
+            ])
+            OrderTracking.objects.bulk_create([
+                OrderTracking(order_id=order.id, status=step)
+                for order in created
+                for step in TRACKING_STEPS[order.status]
+            ])
+            self.progress('Orders', end, total)
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', keywords), 'B') || "
+    "setweight(to_tsvector('english', body), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX shop_productsearch_vector_idx ON shop_productsearchdocument '
+        f'USING GIN (({SEARCH_VECTOR_SQL}))'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS shop_productsearch_vector_idx')
+
+
+def populate_search_documents(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductSearchDocument = apps.get_model('shop', 'ProductSearchDocument')
+    documents = []
+    for product in Product.objects.select_related('category').prefetch_related('flower_types'):
+        keywords = [product.category.name] + [ft.name for ft in product.flower_types.all()]
+        documents.append(ProductSearchDocument(
+            product=product,
+            name=product.name,
+            keywords=' '.join(keywords),
+            body=' '.join([product.short_description, product.description, product.contains]),
+            is_available=product.is_available,
+        ))
+    ProductSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_sitesettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='shop.product')),
+                ('name', models.CharField(max_length=200)),
+                ('keywords', models.TextField(blank=True, help_text='Category and flower type names')),
+                ('body', models.TextField(blank=True, help_text='Description and contents')),
+                ('is_available', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:00
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+
+
+PRICE_BUCKET_EDGES = [500, 1000, 2000, 5000]
+
+
+def populate_facet_counts(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductFacetCount = apps.get_model('shop', 'ProductFacetCount')
+    counts = Counter()
+    for product in Product.objects.filter(is_available=True).prefetch_related('flower_types'):
+        bucket = sum(1 for edge in PRICE_BUCKET_EDGES if product.price >= edge)
+        base = (product.category_id, product.size, product.same_day_delivery, bucket)
+        counts[base + (0,)] += 1
+        for flower_type in product.flower_types.all():
+            counts[base + (flower_type.id,)] += 1
+    ProductFacetCount.objects.bulk_create([
+        ProductFacetCount(
+            category_id=category_id,
+            size=size,
+            same_day_delivery=same_day,
+            price_bucket=bucket,
+            flower_type_id=flower_type_id,
+            count=count,
+        )
+        for (category_id, size, same_day, bucket, flower_type_id), count in counts.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_productsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=20)),
+                ('same_day_delivery', models.BooleanField()),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('flower_type_id', models.PositiveIntegerField(default=0, help_text='0 counts every product; otherwise only products containing this flower type')),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='shop.category')),
+            ],
+            options={
+                'unique_together': {('category', 'size', 'same_day_delivery', 'price_bucket', 'flower_type_id')},
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reserved_stock',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -95,6 +95,7 @@ class Product(models.Model):
     
     # Inventory
     stock = models.PositiveIntegerField(default=10)
+    reserved_stock = models.PositiveIntegerField(default=0, editable=False)  # Held for orders awaiting payment; not in stock
     is_available = models.BooleanField(default=True)
     
     # Flags
@@ -150,6 +151,61 @@ class Product(models.Model):
         return self.stock > 0 and self.is_available
 
 
+class ProductSearchDocument(models.Model):
+    """Denormalized search text for a product, kept current by shop.signals"""
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        related_name='search_document',
+        on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=200)
+    keywords = models.TextField(blank=True, help_text="Category and flower type names")
+    body = models.TextField(blank=True, help_text="Description and contents")
+    is_available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Search document for {self.name}"
+
+
+class ProductFacetCount(models.Model):
+    """Number of available products per facet combination, kept current by shop.signals"""
+    category = models.ForeignKey(Category, related_name='facet_counts', on_delete=models.CASCADE)
+    size = models.CharField(max_length=20)
+    same_day_delivery = models.BooleanField()
+    price_bucket = models.PositiveSmallIntegerField()
+    flower_type_id = models.PositiveIntegerField(
+        default=0,
+        help_text="0 counts every product; otherwise only products containing this flower type"
+    )
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['category', 'size', 'same_day_delivery', 'price_bucket', 'flower_type_id']
+
+    def __str__(self):
+        return f"{self.category_id}/{self.size}/{self.price_bucket}/{self.flower_type_id}: {self.count}"
+
+
+class RelatedProduct(models.Model):
+    """Products frequently bought together, built by the build_related_products command"""
+    product = models.ForeignKey(Product, related_name='related_entries', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='+', on_delete=models.CASCADE)
+    score = models.PositiveIntegerField(help_text="Number of orders containing both products")
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
 class ProductReview(models.Model):
     """Customer reviews for products"""
     product = models.ForeignKey(Product, related_name='reviews', on_delete=models.CASCADE)
@@ -0,0 +1,163 @@
+"""
+Keyset (cursor) pagination for the catalog listings.
+
+Offset pagination costs OFFSET n plus a full COUNT(*) on every page. A
+KeysetPaginator instead remembers the sort value and id of the last row it
+returned in an opaque signed token and asks for rows strictly after it, so
+the database seeks straight to the page through the ordering index.
+"""
+
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+CURSOR_SALT = 'shop.pagination.cursor'
+DEFAULT_COUNT_CAP = object()
+
+
+def cursor_mode_enabled(request):
+    """Use cursors when configured, or when the client already holds one"""
+    return getattr(settings, 'CATALOG_PAGINATION', 'offset') == 'cursor' or 'cursor' in request.GET
+
+
+def paginate(request, queryset, per_page, ordering='-created_at'):
+    """Return a page of queryset using the configured pagination mode"""
+    if cursor_mode_enabled(request):
+        return KeysetPaginator(queryset, per_page, ordering).get_page(request)
+    paginator = Paginator(queryset, per_page)
+    return paginator.get_page(request.GET.get('page', 1))
+
+
+class CursorPage:
+    """A page of results with next/previous cursor tokens instead of page numbers"""
+    is_cursor = True
+
+    def __init__(self, object_list, request, next_cursor=None, previous_cursor=None,
+                 total=None, total_is_capped=False):
+        self.object_list = object_list
+        self.request = request
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_is_capped = total_is_capped
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _url(self, cursor):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return '?' + params.urlencode()
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor) if self.next_cursor else None
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor) if self.previous_cursor else None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on a single sort field with an id tiebreaker.
+
+    ordering is one of the listing sorts, e.g. '-created_at', 'price',
+    '-price' or '-rating'. Totals are counted up to CATALOG_COUNT_CAP rows
+    (None counts exactly, 0 skips counting).
+    """
+
+    def __init__(self, queryset, per_page, ordering='-created_at', count_cap=DEFAULT_COUNT_CAP):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        self.model_field = queryset.model._meta.get_field(self.field)
+        if count_cap is DEFAULT_COUNT_CAP:
+            count_cap = getattr(settings, 'CATALOG_COUNT_CAP', 1000)
+        self.count_cap = count_cap
+
+    def encode(self, obj, direction):
+        value = self.model_field.value_to_string(obj)
+        return signing.dumps([self.field, value, obj.pk, direction], salt=CURSOR_SALT, compress=True)
+
+    def decode(self, token):
+        """Return (value, pk, direction), or None for a missing or tampered token"""
+        try:
+            field, value, pk, direction = signing.loads(token, salt=CURSOR_SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        if field != self.field or direction not in ('next', 'prev'):
+            return None
+        return self.model_field.to_python(value), pk, direction
+
+    def _ordering(self, forward):
+        # Walking backwards flips the direction, then the page is reversed
+        descending = self.descending == forward
+        prefix = '-' if descending else ''
+        return [prefix + self.field, prefix + 'pk']
+
+    def _after(self, value, pk, forward):
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value}) |
+            Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def get_page(self, request):
+        cursor = self.decode(request.GET.get('cursor', ''))
+        forward = cursor is None or cursor[2] == 'next'
+
+        queryset = self.queryset.order_by(*self._ordering(forward))
+        if cursor is not None:
+            value, pk, direction = cursor
+            queryset = queryset.filter(self._after(value, pk, forward))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        has_next = has_more if forward else True
+        has_previous = cursor is not None if forward else has_more
+
+        total, capped = self.count()
+        return CursorPage(
+            rows,
+            request,
+            next_cursor=self.encode(rows[-1], 'next') if rows and has_next else None,
+            previous_cursor=self.encode(rows[0], 'prev') if rows and has_previous else None,
+            total=total,
+            total_is_capped=capped,
+        )
+
+    def count(self):
+        """Return (count, capped) without scanning more than count_cap rows"""
+        if self.count_cap == 0:
+            return None, False
+        queryset = self.queryset.order_by()
+        if self.count_cap is None:
+            return queryset.count(), False
+        count = queryset.values('pk')[:self.count_cap + 1].count()
+        if count > self.count_cap:
+            return self.count_cap, True
+        return count, False
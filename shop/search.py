@@ -0,0 +1,240 @@
+"""
+Product search index.
+
+Every product has a ProductSearchDocument row holding its searchable text.
+On PostgreSQL the rows are queried through a GIN-indexed tsvector expression
+(see migration 0003); on other databases each worker keeps an in-memory
+inverted index that is loaded once and then synced from updated_at deltas.
+Deltas never show a deleted row, so every SEARCH_INDEX_PRUNE_INTERVAL seconds
+the worker also reads the ids of all documents and drops the products missing
+from them.
+"""
+
+import bisect
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ProductSearchDocument
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Same expression as the GIN index created in migration 0003 - keep in sync
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', name), 'A') || "
+    "setweight(to_tsvector('english', keywords), 'B') || "
+    "setweight(to_tsvector('english', body), 'C')"
+)
+
+# Mirrors the default ts_rank weights for A, B and C
+FIELD_WEIGHTS = {'name': 1.0, 'keywords': 0.4, 'body': 0.2}
+PREFIX_MATCH_FACTOR = 0.5
+MIN_PREFIX_LENGTH = 2
+
+# Re-read recent rows on each sync so slow transactions are not missed
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_document(product):
+    """Build (unsaved) search document for a product"""
+    keywords = [product.category.name] + [ft.name for ft in product.flower_types.all()]
+    return ProductSearchDocument(
+        product=product,
+        name=product.name,
+        keywords=' '.join(keywords),
+        body=' '.join([product.short_description, product.description, product.contains]),
+        is_available=product.is_available,
+    )
+
+
+def index_products(queryset):
+    """Create or refresh search documents for the given products"""
+    products = queryset.select_related('category').prefetch_related('flower_types')
+    documents = [build_document(product) for product in products]
+    if not documents:
+        return 0
+    ProductSearchDocument.objects.bulk_create(
+        documents,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['name', 'keywords', 'body', 'is_available', 'updated_at'],
+    )
+    backend = get_backend()
+    for document in documents:
+        backend.update(document)
+    return len(documents)
+
+
+def remove_product(product_id):
+    """Drop a deleted product from this worker's index"""
+    get_backend().remove(product_id)
+
+
+def search_products(query, limit=None):
+    """Return ids of available products matching query, best match first"""
+    if limit is None:
+        limit = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    if not tokenize(query):
+        return []
+    return get_backend().search(query, limit)
+
+
+class PostgresSearchBackend:
+    """Full-text search over the GIN-indexed tsvector expression"""
+
+    def search(self, query, limit):
+        tsquery = ' & '.join(f'{token}:*' for token in tokenize(query))
+        sql = (
+            f'SELECT product_id, ts_rank({SEARCH_VECTOR_SQL}, q) AS rank '
+            f"FROM shop_productsearchdocument, to_tsquery('english', %s) q "
+            f'WHERE is_available AND {SEARCH_VECTOR_SQL} @@ q '
+            f'ORDER BY rank DESC, product_id LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [tsquery, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def update(self, document):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+
+class PythonSearchBackend:
+    """Per-worker inverted index used when PostgreSQL is not available"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}  # token -> {product_id: weight}
+        self.doc_tokens = {}  # product_id -> set of tokens
+        self.vocabulary = []  # sorted tokens, for prefix lookups
+        self.synced_at = None
+        self.checked_at = 0
+        self.pruned_at = 0
+
+    def search(self, query, limit):
+        self.sync()
+        scores = None
+        with self.lock:
+            for token in set(tokenize(query)):
+                matches = self._match(token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        product_id: score + matches[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in matches
+                    }
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, score in ranked[:limit]]
+
+    def _match(self, token):
+        matches = dict(self.postings.get(token, {}))
+        if len(token) < MIN_PREFIX_LENGTH:
+            return matches
+        start = bisect.bisect_right(self.vocabulary, token)
+        for term in self.vocabulary[start:]:
+            if not term.startswith(token):
+                break
+            for product_id, weight in self.postings[term].items():
+                weight *= PREFIX_MATCH_FACTOR
+                if weight > matches.get(product_id, 0):
+                    matches[product_id] = weight
+        return matches
+
+    def sync(self):
+        """Load the index on first use, then pick up rows changed by other workers"""
+        interval = getattr(settings, 'SEARCH_INDEX_SYNC_INTERVAL', 5)
+        prune_interval = getattr(settings, 'SEARCH_INDEX_PRUNE_INTERVAL', 300)
+        now = time.monotonic()
+        if self.synced_at is not None and now - self.checked_at < interval:
+            return
+        self.checked_at = now
+        if self.synced_at is None:
+            self.pruned_at = now
+        elif now - self.pruned_at >= prune_interval:
+            self._prune()
+            self.pruned_at = now
+        documents = ProductSearchDocument.objects.all()
+        if self.synced_at is not None:
+            documents = documents.filter(updated_at__gte=self.synced_at - SYNC_OVERLAP)
+        synced_at = self.synced_at
+        for document in documents.iterator(chunk_size=2000):
+            self._apply(document)
+            if synced_at is None or document.updated_at > synced_at:
+                synced_at = document.updated_at
+        self.synced_at = synced_at or timezone.now()
+
+    def _prune(self):
+        """Drop products whose documents were deleted by other workers"""
+        # Only products indexed before the query: one added meanwhile may be missing from its result
+        indexed = set(self.doc_tokens)
+        existing = set(ProductSearchDocument.objects.values_list('product_id', flat=True))
+        with self.lock:
+            for product_id in indexed - existing:
+                self._remove(product_id)
+
+    def update(self, document):
+        # Before the first sync there is nothing to patch; the full load picks it up
+        if self.synced_at is not None:
+            self._apply(document)
+
+    def _apply(self, document):
+        with self.lock:
+            self._remove(document.product_id)
+            if document.is_available:
+                self._add(document)
+
+    def remove(self, product_id):
+        with self.lock:
+            self._remove(product_id)
+
+    def _add(self, document):
+        weights = {}
+        for field, field_weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(document, field)):
+                weights[token] = weights.get(token, 0) + field_weight
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                bisect.insort(self.vocabulary, token)
+            self.postings[token][document.product_id] = weight
+        self.doc_tokens[document.product_id] = set(weights)
+
+    def _remove(self, product_id):
+        for token in self.doc_tokens.pop(product_id, ()):
+            posting = self.postings[token]
+            posting.pop(product_id, None)
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+
+_backend = None
+
+
+def get_backend():
+    """Return the search backend for this worker"""
+    global _backend
+    if _backend is None:
+        name = getattr(settings, 'SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            name = 'postgres' if connection.vendor == 'postgresql' else 'python'
+        _backend = PostgresSearchBackend() if name == 'postgres' else PythonSearchBackend()
+    return _backend
@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Banner, Category, FlowerType, Product, Wishlist
+from .cache import bump_catalog_version, bump_user_version
+from .catalog import catalog
+from . import facets, search
+
+
+@receiver(pre_save, sender=Product)
+def snapshot_product_facets(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._facet_snapshot = facets.snapshot([instance.pk]) if instance.pk else {}
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products(Product.objects.filter(pk=instance.pk))
+    facets.apply_change(getattr(instance, '_facet_snapshot', {}), facets.snapshot([instance.pk]))
+    catalog.update(instance)
+
+
+@receiver(pre_delete, sender=Product)
+def snapshot_deleted_product_facets(sender, instance, **kwargs):
+    instance._facet_snapshot = facets.snapshot([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_product(instance.pk)
+    facets.apply_change(getattr(instance, '_facet_snapshot', {}), {})
+    catalog.remove(instance.pk)
+
+
+@receiver(m2m_changed, sender=Product.flower_types.through)
+def index_product_flower_types(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'pre_clear':
+        product_ids = instance._cleared_product_ids = list(
+            instance.products.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        product_ids = instance.__dict__.pop('_cleared_product_ids', [])
+    else:
+        product_ids = list(pk_set or ())
+
+    if action.startswith('pre_'):
+        instance._facet_snapshot = facets.snapshot(product_ids)
+    elif product_ids:
+        search.index_products(Product.objects.filter(pk__in=product_ids))
+        facets.apply_change(getattr(instance, '_facet_snapshot', {}), facets.snapshot(product_ids))
+
+
+@receiver(post_save, sender=Category)
+def index_category_products(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        search.index_products(instance.products.all())
+
+
+@receiver(post_save, sender=FlowerType)
+def index_flower_type_products(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        search.index_products(instance.products.all())
+
+
+@receiver(pre_delete, sender=FlowerType)
+def collect_flower_type_products(sender, instance, **kwargs):
+    # The M2M rows are gone by post_delete, so remember who to reindex
+    instance._indexed_product_ids = list(instance.products.values_list('pk', flat=True))
+    instance._facet_snapshot = facets.snapshot(instance._indexed_product_ids)
+
+
+@receiver(post_delete, sender=FlowerType)
+def index_deleted_flower_type_products(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_indexed_product_ids', None)
+    if product_ids:
+        search.index_products(Product.objects.filter(pk__in=product_ids))
+        facets.apply_change(instance._facet_snapshot, facets.snapshot(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=FlowerType)
+@receiver(post_delete, sender=FlowerType)
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Product.flower_types.through)
+def catalog_flower_types_changed(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def user_wishlist_changed(sender, instance, **kwargs):
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_user_version(instance.pk)
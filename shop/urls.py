@@ -8,6 +8,7 @@ urlpatterns = [
     path('products/category/<slug:category_slug>/', views.ProductListView.as_view(), name='product_list_by_category'),
     path('product/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
     path('occasion/<str:occasion>/', views.products_by_occasion, name='products_by_occasion'),
     path('wishlist/add/<int:product_id>/', views.add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist, name='remove_from_wishlist'),
@@ -3,18 +3,37 @@ from django.views.generic import ListView, DetailView
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q, Avg
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.db.models import Q, Avg, Count
 from django.core.paginator import Paginator
-from django.utils import timezone
+from django.utils.decorators import method_decorator
 
-from .models import Category, Product, ProductReview, Wishlist, Banner, FlowerType, SiteSettings
+from .models import (
+    Category, Product, ProductReview, Wishlist, Banner, FlowerType, SiteSettings, RelatedProduct
+)
 from .forms import ProductForm, CategoryForm, FlowerTypeForm
+from .search import search_products
+from .pagination import KeysetPaginator, cursor_mode_enabled, paginate
+from .cache import CSRF_PLACEHOLDER, fill_csrf_token, get_fragment
+from .catalog import catalog
+from .autocomplete import autocomplete_index
+from .conditional import catalog_page, product_page, quick_view_page
+from . import facets
 from orders.models import Order, OrderTracking
+from orders.services import STATUS_TRACKING, transition_orders
 
 
+@catalog_page
 def home(request):
     """Homepage view"""
+    # Catalog sections are cached until the catalog changes; base.html stays per-request
+    html = get_fragment('home', render_home_sections)
+    return render(request, 'shop/home.html', {'home_sections': fill_csrf_token(request, html)})
+
+
+def render_home_sections():
+    """Render the catalog part of the homepage for the fragment cache"""
     banners = Banner.objects.filter(is_active=True)
     categories = Category.objects.filter(is_active=True)[:8]
     featured_products = Product.objects.filter(is_featured=True, is_available=True)[:8]
@@ -40,10 +59,12 @@ def home(request):
         'bestsellers': bestsellers,
         'new_arrivals': new_arrivals,
         'occasions': occasions,
+        'csrf_token': CSRF_PLACEHOLDER,
     }
-    return render(request, 'shop/home.html', context)
+    return render_to_string('shop/includes/home_sections.html', context)
 
 
+@method_decorator(catalog_page, name='dispatch')
 class ProductListView(ListView):
     """List all products with filtering"""
     model = Product
@@ -75,6 +96,11 @@ class ProductListView(ListView):
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
         
+        # Price bucket filter
+        price_bucket = facets.parse_price_bucket(self.request.GET.get('price'))
+        if price_bucket is not None:
+            queryset = facets.filter_price_bucket(queryset, price_bucket)
+        
         # Size filter
         size = self.request.GET.get('size')
         if size:
@@ -88,35 +114,81 @@ class ProductListView(ListView):
         # Sort
         sort = self.request.GET.get('sort', 'newest')
         if sort == 'price_low':
-            queryset = queryset.order_by('price')
+            self.sort_ordering = 'price'
         elif sort == 'price_high':
-            queryset = queryset.order_by('-price')
+            self.sort_ordering = '-price'
         elif sort == 'rating':
-            queryset = queryset.order_by('-rating')
+            self.sort_ordering = '-rating'
         elif sort == 'bestseller':
             queryset = queryset.filter(is_bestseller=True)
+            self.sort_ordering = '-created_at'
         else:  # newest
-            queryset = queryset.order_by('-created_at')
+            self.sort_ordering = '-created_at'
         
-        return queryset
+        # id tiebreaker keeps pages stable when sort values repeat
+        tiebreaker = '-id' if self.sort_ordering.startswith('-') else 'id'
+        return queryset.order_by(self.sort_ordering, tiebreaker)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not cursor_mode_enabled(self.request):
+            return super().paginate_queryset(queryset, page_size)
+        page = KeysetPaginator(queryset, page_size, self.sort_ordering).get_page(self.request)
+        return (None, page, page.object_list, page.has_other_pages())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(is_active=True)
-        context['current_category'] = getattr(self, 'category', None)
-        context['flower_types'] = FlowerType.objects.all()
-        context['size_choices'] = Product.SIZE_CHOICES
-        context['current_filters'] = {
+        current_category = getattr(self, 'category', None)
+        current_filters = {
             'occasion': self.request.GET.get('occasion', ''),
             'min_price': self.request.GET.get('min_price', ''),
             'max_price': self.request.GET.get('max_price', ''),
+            'price': self.request.GET.get('price', ''),
             'size': self.request.GET.get('size', ''),
             'same_day': self.request.GET.get('same_day', ''),
             'sort': self.request.GET.get('sort', 'newest'),
         }
+        
+        # Sidebar counts - free-form price ranges don't match the precomputed buckets
+        facet_filters = {
+            'category': current_category.id if current_category else None,
+            'occasion': current_filters['occasion'],
+            'size': current_filters['size'],
+            'same_day': bool(current_filters['same_day']),
+            'price': facets.parse_price_bucket(current_filters['price']),
+        }
+        if current_filters['min_price'] or current_filters['max_price']:
+            facet_counts = facets.naive_facet_counts(
+                min_price=current_filters['min_price'],
+                max_price=current_filters['max_price'],
+                **facet_filters
+            )
+        else:
+            facet_counts = facets.get_facet_counts(**facet_filters)
+        
+        categories = list(Category.objects.filter(is_active=True))
+        for category in categories:
+            category.facet_count = facet_counts['category'][category.id]
+        flower_types = list(FlowerType.objects.all())
+        for flower_type in flower_types:
+            flower_type.facet_count = facet_counts['flower_type'][flower_type.id]
+        
+        context['categories'] = categories
+        context['current_category'] = current_category
+        context['flower_types'] = flower_types
+        context['size_choices'] = [
+            (value, label, facet_counts['size'][value]) for value, label in Product.SIZE_CHOICES
+        ]
+        context['price_buckets'] = [
+            (str(index), facets.price_bucket_label(index), facet_counts['price'][index])
+            for index in range(len(facets.PRICE_BUCKETS))
+        ]
+        context['same_day_count'] = facet_counts['same_day'][True]
+        context['total_count'] = facet_counts['total']
+        context['current_filters'] = current_filters
         return context
 
 
+@method_decorator(product_page, name='dispatch')
 class ProductDetailView(DetailView):
     """Product detail view"""
     model = Product
@@ -124,15 +196,31 @@ class ProductDetailView(DetailView):
     context_object_name = 'product'
     slug_url_kwarg = 'slug'
 
+    def get_object(self, queryset=None):
+        # Unknown slugs 404 from the snapshot; known ones load by primary key
+        record = catalog.get_by_slug_or_404(self.kwargs['slug'])
+        try:
+            return Product.objects.select_related('category').get(pk=record.id)
+        except Product.DoesNotExist:
+            raise Http404('No product matches the given query.')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
         
-        # Related products
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            is_available=True
-        ).exclude(id=product.id)[:4]
+        # Related products: frequently bought together, else the same category
+        related_products = [
+            entry.related for entry in RelatedProduct.objects.filter(
+                product=product,
+                related__is_available=True
+            ).select_related('related')[:4]
+        ]
+        if not related_products:
+            related_products = Product.objects.filter(
+                category=product.category,
+                is_available=True
+            ).exclude(id=product.id)[:4]
+        context['related_products'] = related_products
         
         # Reviews
         context['reviews'] = product.reviews.all()[:10]
@@ -151,28 +239,31 @@ class ProductDetailView(DetailView):
 def search(request):
     """Search products"""
     query = request.GET.get('q', '')
-    products = Product.objects.filter(is_available=True)
     
     if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(flower_types__name__icontains=query)
-        ).distinct()
-    
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page', 1)
-    products = paginator.get_page(page)
+        # Paginate the ranked ids, then load only the products on this page
+        paginator = Paginator(search_products(query), 12)
+        products = paginator.get_page(request.GET.get('page', 1))
+        products_by_id = Product.objects.in_bulk(products.object_list)
+        products.object_list = [
+            products_by_id[product_id]
+            for product_id in products.object_list
+            if product_id in products_by_id
+        ]
+        total_results = paginator.count
+    else:
+        products = paginate(request, Product.objects.filter(is_available=True), 12)
+        total_results = products.total if getattr(products, 'is_cursor', False) else products.paginator.count
     
     context = {
         'products': products,
         'query': query,
-        'total_results': paginator.count,
+        'total_results': total_results,
     }
     return render(request, 'shop/search_results.html', context)
 
 
+@catalog_page
 def products_by_occasion(request, occasion):
     """Filter products by occasion"""
     products = Product.objects.filter(
@@ -183,9 +274,7 @@ def products_by_occasion(request, occasion):
     occasion_names = dict(Category.OCCASION_CHOICES)
     occasion_name = occasion_names.get(occasion, 'Products')
     
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page', 1)
-    products = paginator.get_page(page)
+    products = paginate(request, products, 12)
     
     context = {
         'products': products,
@@ -199,10 +288,10 @@ def products_by_occasion(request, occasion):
 @login_required
 def add_to_wishlist(request, product_id):
     """Add product to wishlist"""
-    product = get_object_or_404(Product, id=product_id)
+    product = catalog.get_or_404(product_id)
     wishlist, created = Wishlist.objects.get_or_create(
         user=request.user,
-        product=product
+        product_id=product.id
     )
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -270,9 +359,10 @@ def add_review(request, product_id):
     return redirect('shop:home')
 
 
+@quick_view_page
 def quick_view(request, product_id):
     """Quick view modal data"""
-    product = get_object_or_404(Product, id=product_id)
+    product = catalog.get_or_404(product_id)
     
     data = {
         'id': product.id,
@@ -280,7 +370,7 @@ def quick_view(request, product_id):
         'price': str(product.price),
         'discount_price': str(product.discount_price) if product.discount_price else None,
         'discount_percentage': product.discount_percentage,
-        'image': product.image.url if product.image else '',
+        'image': product.image_url,
         'short_description': product.short_description,
         'size': product.get_size_display(),
         'in_stock': product.in_stock,
@@ -293,6 +383,16 @@ def quick_view(request, product_id):
     return JsonResponse(data)
 
 
+def autocomplete(request):
+    """Search box suggestions"""
+    query = request.GET.get('q', '')[:100]
+    suggestions = autocomplete_index.suggest(query)
+    return JsonResponse({
+        'query': query,
+        'suggestions': [suggestion.as_dict() for suggestion in suggestions],
+    })
+
+
 # ============================================
 # PRODUCT MANAGEMENT VIEWS (Staff Only)
 # ============================================
@@ -300,7 +400,7 @@ def quick_view(request, product_id):
 @staff_member_required
 def product_management(request):
     """Product management dashboard"""
-    products = Product.objects.all().order_by('-created_at')
+    products = Product.objects.select_related('category').order_by('-created_at')
     categories = Category.objects.all()
     flower_types = FlowerType.objects.all()
     
@@ -420,7 +520,7 @@ def product_toggle_status(request, product_id):
 @staff_member_required
 def category_management(request):
     """Category management"""
-    categories = Category.objects.all().order_by('name')
+    categories = Category.objects.annotate(product_count=Count('products')).order_by('name')
     
     if request.method == 'POST':
         form = CategoryForm(request.POST, request.FILES)
@@ -468,7 +568,7 @@ def category_delete(request, category_id):
 @staff_member_required
 def flower_type_management(request):
     """Flower type management"""
-    flower_types = FlowerType.objects.all().order_by('name')
+    flower_types = FlowerType.objects.annotate(product_count=Count('products')).order_by('name')
     
     if request.method == 'POST':
         form = FlowerTypeForm(request.POST, request.FILES)
@@ -503,7 +603,7 @@ def flower_type_delete(request, flower_type_id):
 @staff_member_required
 def order_management(request):
     """Order management dashboard"""
-    orders = Order.objects.all().order_by('-created_at')
+    orders = Order.objects.order_by('-created_at')
     
     # Search
     query = request.GET.get('q', '')
@@ -544,7 +644,7 @@ def order_management(request):
 @staff_member_required
 def order_detail_manage(request, order_id):
     """Order detail for management"""
-    order = get_object_or_404(Order, order_id=order_id)
+    order = get_object_or_404(Order.objects.prefetch_related('items__product'), order_id=order_id)
     tracking = order.tracking.all().order_by('-created_at')
     
     context = {
@@ -564,37 +664,17 @@ def order_update_status(request, order_id):
         notes = request.POST.get('notes', '')
         
         if new_status and new_status != order.status:
-            old_status = order.status
-            order.status = new_status
-            
-            # Set delivered_at timestamp when delivered
-            if new_status == 'delivered' and not order.delivered_at:
-                order.delivered_at = timezone.now()
-            
-            order.save()
-            
-            # Create tracking entry
-            status_messages = {
-                'pending': ('Order Pending', 'Order is waiting to be processed.'),
-                'confirmed': ('Order Confirmed', 'Your order has been confirmed and is being processed.'),
-                'processing': ('Order Processing', 'Your beautiful arrangement is being prepared with care.'),
-                'out_for_delivery': ('Out for Delivery', 'Your flowers are on the way! Our delivery partner will reach you soon.'),
-                'delivered': ('Delivered', 'Your order has been delivered successfully. Enjoy your flowers!'),
-                'cancelled': ('Order Cancelled', 'Your order has been cancelled.'),
-                'refunded': ('Order Refunded', 'Your payment has been refunded.'),
-            }
-            
-            if new_status in status_messages:
-                status_title, description = status_messages[new_status]
-                if notes:
-                    description = notes
-                OrderTracking.objects.create(
-                    order=order,
-                    status=status_title,
-                    description=description
+            if new_status not in STATUS_TRACKING:
+                messages.error(request, 'Unknown order status.')
+            elif transition_orders(Order.objects.filter(pk=order.pk), new_status, notes):
+                order.status = new_status
+                messages.success(request, f'Order status updated to {order.get_status_display()}!')
+            else:
+                messages.error(
+                    request,
+                    f'A {order.get_status_display().lower()} order cannot be changed to '
+                    f'{dict(Order.ORDER_STATUS_CHOICES)[new_status].lower()}.'
                 )
-            
-            messages.success(request, f'Order status updated to {order.get_status_display()}!')
         else:
             messages.info(request, 'No status change made.')
     